@@ -0,0 +1,126 @@
+import time
+import asyncio
+from app.config import Config
+from app.context import count_tokens
+
+# Generated tokens allowed per node call; the remaining request budget can only lower them.
+NODE_TOKEN_CAPS = {
+    "supervisor": Config.SUPERVISOR_MAX_TOKENS,
+    "guardian": Config.GUARDIAN_MAX_TOKENS,
+    "medical_expert": 700,
+    "profiler": 250,
+    "translator": 800,
+    "simple_medical": 600,
+    "general_chat": 400,
+}
+
+# Answer sent when the budget runs out before one is written, by request
+# language (the values of the language selector; French is the app's default).
+BUDGET_FALLBACKS = {
+    "Français": (
+        "Désolé, je n'ai pas pu terminer cette réponse à temps. "
+        "Veuillez réessayer, ou poser une question plus courte."
+    ),
+    "English": (
+        "I'm sorry, I could not finish this answer in time. "
+        "Please try again, or ask a shorter question."
+    ),
+    "Espagnol": (
+        "Lo siento, no he podido terminar esta respuesta a tiempo. "
+        "Vuelva a intentarlo o haga una pregunta más corta."
+    ),
+}
+
+
+def budget_fallback(state):
+    """BUDGET_FALLBACKS message in the language of the request (French if unknown)."""
+    language = (state.get("user_profile") or {}).get("language", "")
+    return BUDGET_FALLBACKS.get(language, BUDGET_FALLBACKS["Français"])
+
+
+class BudgetExhausted(Exception):
+    """The request has no tokens or time left for this node."""
+
+
+def new_budget(max_tokens=None, seconds=None):
+    """Budget of one request: generated tokens and wall-clock seconds."""
+    now = time.time()
+    seconds = seconds or Config.REQUEST_TIME_BUDGET
+    return {
+        "max_tokens": max_tokens or Config.REQUEST_TOKEN_BUDGET,
+        "started": now,
+        "deadline": now + seconds,
+    }
+
+
+def tokens_left(state):
+    budget = state.get("budget")
+    if not budget:
+        return None
+    return budget["max_tokens"] - state.get("tokens_used", 0)
+
+
+def seconds_left(state):
+    budget = state.get("budget")
+    if not budget:
+        return None
+    return budget["deadline"] - time.time()
+
+
+def is_exhausted(state, min_tokens=1):
+    """True once fewer than min_tokens tokens, or no time at all, remain."""
+    tokens, seconds = tokens_left(state), seconds_left(state)
+    return (tokens is not None and tokens < min_tokens) or (seconds is not None and seconds <= 0)
+
+
+def usage_report(state):
+    """Budget usage of a finished request, as reported in the response."""
+    budget = state.get("budget")
+    if not budget:
+        return None
+    return {
+        "tokens_used": state.get("tokens_used", 0),
+        "token_budget": budget["max_tokens"],
+        "elapsed_s": round(time.time() - budget["started"], 2),
+        "time_budget_s": round(budget["deadline"] - budget["started"], 2),
+        "exhausted": is_exhausted(state),
+    }
+
+
+def output_tokens(message):
+    """Generated tokens of a response (server-reported when available)."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("output_tokens"):
+        return usage["output_tokens"]
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    if token_usage.get("completion_tokens"):
+        return token_usage["completion_tokens"]
+    content = getattr(message, "content", "")
+    return count_tokens(content) if isinstance(content, str) and content else 0
+
+
+async def ainvoke_within_budget(llm, messages, state, node, structured=False):
+    """
+    Calls llm for the given node with max_tokens = min(node cap, tokens left)
+    and a timeout of the time left. Returns (result, generated tokens).
+    Structured runnables (built with include_raw=True) keep the cap they were
+    built with, so they are only called when that whole cap still fits.
+    Raises BudgetExhausted when the node cannot run or runs out of time.
+    """
+    cap = NODE_TOKEN_CAPS[node]
+    tokens, seconds = tokens_left(state), seconds_left(state)
+    max_tokens = cap if tokens is None else min(cap, tokens)
+    if max_tokens <= 0 or (structured and max_tokens < cap) or (seconds is not None and seconds <= 0):
+        raise BudgetExhausted(node)
+
+    runnable = llm if structured else llm.bind(extra_body={"max_tokens": max_tokens})
+    try:
+        result = await asyncio.wait_for(runnable.ainvoke(messages), timeout=seconds)
+    except asyncio.TimeoutError:
+        raise BudgetExhausted(node)
+
+    if structured:
+        if result["parsed"] is None:
+            raise result["parsing_error"] or ValueError(f"{node}: empty structured output")
+        return result["parsed"], output_tokens(result["raw"])
+    return result, output_tokens(result)
@@ -9,14 +9,75 @@ class Config:
     LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:11434/v1")
     LLM_API_KEY = os.getenv("LLM_API_KEY", "ollama")
     LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2")
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
     # LLM_MODEL = os.getenv("LLM_MODEL", "tinyllama")
+    # Scheduler: calls in flight per model (match Ollama's OLLAMA_NUM_PARALLEL),
+    # per-model overrides as "llama3.2-vision=1,llama3.2=4", and calls allowed
+    # to wait per model before new requests get a 429.
+    LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+    LLM_MODEL_CONCURRENCY = os.getenv("LLM_MODEL_CONCURRENCY", "")
+    LLM_QUEUE_LIMIT = int(os.getenv("LLM_QUEUE_LIMIT", "32"))
 
+    OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     VISION_MODEL_NAME = os.getenv("VISION_MODEL_NAME", "llama3.2-vision")
     # VISION_MODEL_NAME = os.getenv("VISION_MODEL_NAME", "moondream")
+    VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "3"))  # Pages analysed at once
+    VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1120"))  # Longest image side sent to the vision model (px)
+    PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "200"))  # Pages with more embedded text skip OCR
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "./data/ocr_cache")
+    OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
 
 
+     # --- CONVERSATION CONTEXT ---
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))      # History tokens sent per turn
+    CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "3"))            # Last turns always kept verbatim
+    CONTEXT_DOCUMENT_TOKENS = int(os.getenv("CONTEXT_DOCUMENT_TOKENS", "800"))  # Budget for document excerpts
+
+     # --- AGENTS ---
+    PROFILER_CACHE_SIZE = int(os.getenv("PROFILER_CACHE_SIZE", "256"))
+    # Output caps of the structured classification calls (JSON only, no prose)
+    SUPERVISOR_MAX_TOKENS = int(os.getenv("SUPERVISOR_MAX_TOKENS", "32"))
+    GUARDIAN_MAX_TOKENS = int(os.getenv("GUARDIAN_MAX_TOKENS", "200"))
+    # Per-request budget: generated tokens and wall-clock seconds across all nodes.
+    # Once spent, the complex chain publishes the best draft it has.
+    REQUEST_TOKEN_BUDGET = int(os.getenv("REQUEST_TOKEN_BUDGET", "4000"))
+    REQUEST_TIME_BUDGET = float(os.getenv("REQUEST_TIME_BUDGET", "120"))
+    # Supervisor fast path: cosine margin between the two closest categories
+    # above which the query is routed without calling the LLM.
+    ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+
+     # --- SEMANTIC RESPONSE CACHE ---
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+     # --- POST-RESPONSE PIPELINE (fairness audit, titles) ---
+    POST_PROCESS_CONCURRENCY = int(os.getenv("POST_PROCESS_CONCURRENCY", "1"))
+
+     # --- TELEMETRY ---
+    # Response header carrying the request's trace id (empty: no header).
+    # An incoming header of the same name is reused, to follow a request across services.
+    TRACE_ID_HEADER = os.getenv("TRACE_ID_HEADER", "X-Trace-ID")
+
+     # --- ADMIN ---
+    # Token expected in the X-Admin-Token header of admin endpoints
+    # (POST /api/vector_store/reload); empty: those endpoints are disabled.
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+     # --- SESSION STORE ---
+    SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./data/sessions.db")
+    SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "128"))  # Hot session histories kept in memory
+
+     # --- DRUG INDEX (names, synonyms, interactions; built with `python -m app.drug_index build`) ---
+    DRUG_INDEX_PATH = os.getenv("DRUG_INDEX_PATH", "./data/drug_index.json.gz")
+
      # --- VECTOR DATABASE ---
     CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./data/chroma_db")
+    # After a failed load, requests fail fast and the load is retried at most this often (seconds)
+    VECTOR_STORE_RETRY_SECONDS = float(os.getenv("VECTOR_STORE_RETRY_SECONDS", "60"))
     
     # --- NEW: MEDICAL EMBEDDINGS ---
     EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "pritamdeka/S-PubMedBert-MS-MARCO")
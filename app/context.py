@@ -0,0 +1,183 @@
+import re
+import asyncio
+import threading
+from collections import OrderedDict
+import tiktoken
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from app.config import Config
+from app.vector_store import get_session_history, get_session_summary, save_session_summary
+
+DOCUMENT_PREFIX = "Uploaded Document Content:"
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+_encoding = None
+
+
+def count_tokens(text):
+    # cl100k_base is not the Llama tokenizer, but close enough to enforce a budget.
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"Tokenizer unavailable, approximating token counts: {e}")
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+# Stored messages never change, so their LangChain form is built once per
+# message id and reused on every later turn of the session.
+_LC_CACHE_SIZE = 4096
+_lc_messages = OrderedDict()
+_lc_lock = threading.Lock()
+
+
+def to_lc_message(message):
+    """Returns the (memoised) HumanMessage/AIMessage of a stored dialogue message."""
+    key = message.get("id")
+    with _lc_lock:
+        built = _lc_messages.get(key) if key is not None else None
+        if built is not None:
+            _lc_messages.move_to_end(key)
+            return built
+    cls = HumanMessage if message["role"] == "user" else AIMessage
+    # A fixed id: the graph's message reducer would otherwise assign one in place.
+    built = cls(content=message["content"], id=f"msg-{key}" if key is not None else None)
+    if key is not None:
+        with _lc_lock:
+            _lc_messages[key] = built
+            while len(_lc_messages) > _LC_CACHE_SIZE:
+                _lc_messages.popitem(last=False)
+    return built
+
+
+def _words(text):
+    return {w for w in re.findall(r"\w+", text.lower()) if len(w) > 2}
+
+
+def relevant_document_excerpts(documents, query, budget):
+    """
+    Splits the uploaded documents into paragraphs and keeps, within budget
+    tokens, the ones sharing the most words with the query (most recent
+    document first on ties).
+    """
+    query_words = _words(query)
+    candidates = []
+    for doc_rank, document in enumerate(reversed(documents)):
+        for paragraph in re.split(r"\n\s*\n", document):
+            paragraph = paragraph.strip()
+            if paragraph:
+                overlap = len(query_words & _words(paragraph))
+                candidates.append((-overlap, doc_rank, paragraph))
+    candidates.sort(key=lambda c: (c[0], c[1]))
+
+    excerpts, used = [], 0
+    for _, _, paragraph in candidates:
+        tokens = count_tokens(paragraph)
+        if used + tokens > budget:
+            continue
+        excerpts.append(paragraph)
+        used += tokens
+    return excerpts
+
+
+def build_context(history, summary, summary_upto, query, budget=None, keep_turns=None):
+    """
+    Turns a session history into a bounded list of LangChain messages:
+      - the rolling summary of older turns (if any),
+      - the document excerpts relevant to the query,
+      - the last keep_turns turns verbatim, plus older turns the summary does
+        not cover yet, newest first until the token budget is spent.
+    """
+    budget = budget or Config.CONTEXT_TOKEN_BUDGET
+    keep_turns = keep_turns or Config.CONTEXT_KEEP_TURNS
+
+    documents = [m["content"][len(DOCUMENT_PREFIX):].strip() for m in history
+                 if m["role"] == "system" and m["content"].startswith(DOCUMENT_PREFIX)]
+    dialogue = [m for m in history if m["role"] in ("user", "assistant")]
+
+    header = []
+    if summary:
+        header.append(SystemMessage(content=f"{SUMMARY_PREFIX} {summary}"))
+    if documents:
+        doc_budget = min(Config.CONTEXT_DOCUMENT_TOKENS, budget - sum(count_tokens(m.content) for m in header))
+        excerpts = relevant_document_excerpts(documents, query, doc_budget)
+        if excerpts:
+            header.append(SystemMessage(content=f"{DOCUMENT_PREFIX} " + "\n\n".join(excerpts)))
+    used = sum(count_tokens(m.content) for m in header)
+
+    recent = []
+    for position, message in enumerate(reversed(dialogue)):
+        if position >= keep_turns * 2 and message["id"] <= summary_upto:
+            break
+        tokens = count_tokens(message["content"])
+        if recent and used + tokens > budget:
+            break
+        recent.append(message)
+        used += tokens
+
+    messages = list(header)
+    messages.extend(to_lc_message(message) for message in reversed(recent))
+    return messages
+
+
+def standalone_query(messages):
+    """
+    The current question when it is the whole conversation (first turn, no
+    summary, no uploaded document), else None. Only such questions mean the
+    same thing in every session: a follow-up ("Et pendant la grossesse ?")
+    depends on what was said before.
+    """
+    dialogue = [m for m in messages if isinstance(m, (HumanMessage, AIMessage))]
+    if len(dialogue) != 1 or not isinstance(dialogue[0], HumanMessage):
+        return None
+    if any(isinstance(m, SystemMessage) and m.content.startswith((SUMMARY_PREFIX, DOCUMENT_PREFIX)) for m in messages):
+        return None
+    return dialogue[0].content
+
+
+def turns_to_summarize(history, summary_upto, keep_turns=None):
+    """Dialogue messages older than the last keep_turns turns and not yet summarised."""
+    keep_turns = keep_turns or Config.CONTEXT_KEEP_TURNS
+    dialogue = [m for m in history if m["role"] in ("user", "assistant")]
+    older = dialogue[:-keep_turns * 2] if len(dialogue) > keep_turns * 2 else []
+    return [m for m in older if m["id"] > summary_upto]
+
+
+_summarizing = set()
+
+
+async def update_summary(session_id, llm):
+    """
+    Folds the turns that fell out of the verbatim window into the session's
+    rolling summary (one LLM call, only when there is something to fold).
+    Returns the new summary, or None when nothing changed.
+    """
+    if session_id in _summarizing:
+        return None
+    _summarizing.add(session_id)
+    try:
+        history = await asyncio.to_thread(get_session_history, session_id)
+        summary, summary_upto = await asyncio.to_thread(get_session_summary, session_id)
+        pending = turns_to_summarize(history, summary_upto)
+        if not pending:
+            return None
+
+        transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in pending)
+        prompt = (
+            "Update the running summary of a conversation between a patient and a medical assistant.\n"
+            "Keep every medically relevant fact: symptoms, conditions, medications and doses, allergies, "
+            "advice already given, open questions. Be concise (max 150 words).\n\n"
+            f"CURRENT SUMMARY: {summary or 'None'}\n\nNEW EXCHANGES:\n{transcript}\n\nUPDATED SUMMARY:"
+        )
+        response = await llm.ainvoke([HumanMessage(content=prompt)])
+        new_summary = response.content.strip()
+        await asyncio.to_thread(save_session_summary, session_id, new_summary, pending[-1]["id"])
+        return new_summary
+    except Exception as e:
+        print(f"Summary Update Error: {e}")
+        return None
+    finally:
+        _summarizing.discard(session_id)
@@ -0,0 +1,154 @@
+import json
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Optional
+from pydantic import BaseModel, ValidationError, field_validator
+from langchain_core.messages import SystemMessage, HumanMessage
+from app.llm import get_llm
+from app.drug_index import drug_index
+
+logger = logging.getLogger("DocumentPipeline")
+
+# Uploads already know what they need (an explanation of the document), so
+# they skip the chat graph: no supervisor, expert, profiler or guardian call.
+# One streamed explanation and one JSON-mode keyword call, run concurrently.
+EXPLANATION_MAX_TOKENS = 900
+KEYWORDS_MAX_TOKENS = 200
+
+explanation_llm = get_llm(temperature=0.3, max_tokens=EXPLANATION_MAX_TOKENS)
+keywords_llm = get_llm(temperature=0.0, max_tokens=KEYWORDS_MAX_TOKENS).bind(response_format={"type": "json_object"})
+
+# The system prompts never change: the patient profile and the document come
+# last, so the server can reuse the cached prefix from one upload to the next.
+EXPLANATION_PROMPT = """
+You are a medical assistant explaining a medical document (prescription, leaflet, medication box) to a patient.
+Write a clear, reassuring, and educational explanation of the document: its purpose, how to use each medication,
+and the precautions. Do NOT include technical details, and adapt your structure to the age of the patient.
+Answer in the patient's language.
+NO INTRODUCTIONS: Do NOT say Hello, I am Doctor X, Here is a response, or As an AI. Start directly with the explanation.
+"""
+
+KEYWORDS_PROMPT = """
+You extract the key medical entities of a medical document for a patient.
+Return ONE flat JSON object. Keys are categories, written in the patient's language:
+'Médicament', 'Dosage', 'Fréquence', 'Symptôme', 'Type', or other categories the patient should know.
+Values are strings; if a category has several values, combine them (e.g. "Doliprane, Advil").
+"""
+
+# Marker of the former single-call format; nothing after it belongs to the explanation.
+DATA_MARKER = "||DATA||"
+
+
+def _marker_start(text):
+    """Length of the longest end of text that could begin DATA_MARKER (held back while streaming)."""
+    for length in range(min(len(text), len(DATA_MARKER) - 1), 0, -1):
+        if text.endswith(DATA_MARKER[:length]):
+            return length
+    return 0
+
+
+class Medicament(BaseModel):
+    nom: str
+    dosage: str = "INCERTAIN"
+    posologie: str = "INCERTAIN"
+    substance: Optional[str] = None  # Canonical name in the drug index
+
+    @field_validator("nom", "dosage", "posologie", mode="before")
+    @classmethod
+    def _as_text(cls, value):
+        if value is None:
+            return "INCERTAIN"
+        return value.strip() if isinstance(value, str) else str(value)
+
+
+def structure_medicaments(raw_medicaments):
+    """
+    Validates the medications read from the pages (vision or text JSON):
+    entries without a readable name are dropped, and a medication repeated
+    across pages is kept once. Names found in the drug index get their
+    canonical "substance". Returns plain dicts.
+    """
+    medicaments, seen = [], set()
+    for raw in raw_medicaments or []:
+        if not isinstance(raw, dict):
+            continue
+        try:
+            med = Medicament.model_validate(raw)
+        except ValidationError:
+            continue
+        if not med.nom or "INCERTAIN" in med.nom.upper():
+            continue
+        key = (med.nom.lower(), med.dosage.lower(), med.posologie.lower())
+        if key not in seen:
+            seen.add(key)
+            med.substance = drug_index.resolve(med.nom)
+            medicaments.append(med.model_dump())
+    return medicaments
+
+
+def _document_message(full_text, medicaments, age, language):
+    drug_ids = (drug_index.resolve_id(m["nom"]) for m in medicaments if m.get("substance"))
+    drug_facts = drug_index.facts([i for i in drug_ids if i is not None])
+    return HumanMessage(content=(
+        f"PATIENT: {age} years old. Language: {language}.\n"
+        f"STRUCTURED MEDICATIONS: {json.dumps(medicaments, ensure_ascii=False) if medicaments else 'None'}\n"
+        + (f"DRUG INDEX (reference database, mention these interactions):\n{drug_facts}\n" if drug_facts else "")
+        + f"DOCUMENT TEXT:\n{full_text}"
+    ))
+
+
+def _keyword_list(data):
+    keywords = []
+    for key, value in data.items():
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(v) for v in value)
+        elif isinstance(value, dict):
+            value = json.dumps(value, ensure_ascii=False)
+        if value not in (None, ""):
+            keywords.append(f"{key} : {value}")
+    return keywords
+
+
+async def extract_keywords(full_text, medicaments, age, language):
+    """Key entities of the document as "Category : value" strings ([] if the call fails)."""
+    try:
+        response = await keywords_llm.ainvoke([
+            SystemMessage(content=KEYWORDS_PROMPT), _document_message(full_text, medicaments, age, language)])
+        data = json.loads(response.content)
+        return _keyword_list(data) if isinstance(data, dict) else []
+    except Exception as e:
+        logger.error(f"Keyword Extraction Error: {e}")
+        return []
+
+
+async def explain_document(full_text, medicaments, age, language):
+    """
+    Streams the explanation of an uploaded document while its keywords are
+    extracted concurrently. Yields ("token", text) pieces, then
+    ("explanation", {"explanation", "keywords"}).
+    """
+    keywords_task = asyncio.create_task(extract_keywords(full_text, medicaments, age, language))
+    try:
+        text, sent = "", 0
+        messages = [SystemMessage(content=EXPLANATION_PROMPT), _document_message(full_text, medicaments, age, language)]
+        # aclosing: stopping at the marker ends the request and frees its LLM slot at once
+        async with aclosing(explanation_llm.astream(messages)) as stream:
+            async for chunk in stream:
+                if not chunk.content:
+                    continue
+                text += chunk.content
+                if DATA_MARKER in text:
+                    text = text[:text.index(DATA_MARKER)]
+                    break
+                # The marker may arrive split over several chunks ("||", "DATA", "||")
+                end = len(text) - _marker_start(text)
+                if end > sent:
+                    yield "token", text[sent:end]
+                    sent = end
+        if len(text) > sent:
+            yield "token", text[sent:]  # Held-back end that turned out not to be the marker
+        explanation = text.strip()
+        yield "explanation", {"explanation": explanation, "keywords": await keywords_task}
+    finally:
+        keywords_task.cancel()
@@ -0,0 +1,351 @@
+import os
+import csv
+import gzip
+import json
+import time
+import threading
+import unicodedata
+from collections import defaultdict
+from itertools import combinations
+from app.config import Config
+
+# Precomputed drug names, synonyms and pairwise interactions, built once from
+# public dumps (`python -m app.drug_index build ...`) and held in memory:
+# a hash of normalised names for exact lookups and a word trie to spot the
+# names inside free text (user questions, OCR lines) in microseconds.
+
+INDEX_VERSION = 1
+MIN_NAME_LENGTH = 3  # Shorter names ("C", "Fe") match too many ordinary words
+LEVEL_ORDER = {"major": 0, "moderate": 1, "minor": 2}
+
+# RxNorm term types kept as names: ingredients, brands and synonyms
+RXNORM_TERM_TYPES = {"IN", "PIN", "MIN", "BN", "SY", "TMSY"}
+RXNORM_INGREDIENT_TYPES = {"IN", "PIN", "MIN"}
+RXNORM_TRADENAME_RELATIONS = {"tradename_of", "has_tradename"}
+
+_END = None  # Trie key marking the end of a name (never a word)
+
+
+def normalize(text):
+    """Lower-case, accent-free words separated by single spaces."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join("".join(c if c.isalnum() else " " for c in text).split())
+
+
+def _open(path, mode):
+    return gzip.open(path, mode, encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+
+class DrugIndex:
+    """
+    In-memory view of the index file at Config.DRUG_INDEX_PATH. It is loaded
+    once (by warm_up() at server startup); until then, or when the file does
+    not exist, every lookup finds nothing and callers carry on without it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.DRUG_INDEX_PATH
+        self._lock = threading.Lock()
+        self._data = None  # (drugs, names, trie, interactions), swapped in one assignment
+        self._load_seconds = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._data is not None
+
+    def warm_up(self):
+        """Loads the index, recording (not raising) any error for /api/stats."""
+        if not os.path.exists(self.path):
+            self.error = f"{self.path} not found (build it with `python -m app.drug_index build`)"
+            return
+        try:
+            self.load()
+        except Exception as e:
+            self.error = str(e)
+            print(f"Drug Index Load Error: {e}")
+
+    def load(self):
+        start = time.perf_counter()
+        with _open(self.path, "rt") as f:
+            payload = json.load(f)
+        if payload.get("version") != INDEX_VERSION:
+            raise ValueError(f"unsupported drug index version {payload.get('version')}")
+
+        drugs, names = payload["drugs"], payload["names"]
+        trie = {}
+        for name, drug_id in names.items():
+            node = trie
+            for word in name.split(" "):
+                node = node.setdefault(word, {})
+            node[_END] = drug_id
+        interactions = {}
+        for a, b, level, description in payload["interactions"]:
+            interactions[(a, b) if a < b else (b, a)] = (level, description)
+
+        with self._lock:
+            self._data = (drugs, names, trie, interactions)
+            self._load_seconds = time.perf_counter() - start
+            self.error = None
+
+    def name(self, drug_id):
+        """Canonical display name of a drug id."""
+        return self._data[0][drug_id]
+
+    def resolve_id(self, name):
+        """Drug id of a drug name or synonym (also inside a longer label), or None."""
+        if self._data is None or not name:
+            return None
+        drug_id = self._data[1].get(normalize(name))
+        if drug_id is not None:
+            return drug_id
+        found = self.find(name)
+        return found[0] if found else None
+
+    def resolve(self, name):
+        """Canonical name of a drug name or synonym (also inside a longer label), or None."""
+        drug_id = self.resolve_id(name)
+        return self.name(drug_id) if drug_id is not None else None
+
+    def find(self, text):
+        """
+        Ids of the drugs mentioned in text, in order of appearance (longest match wins).
+        Lookups take ids, not canonical names: a canonical name is not always
+        a key of the index (too short, or a name shared with another drug).
+        """
+        if self._data is None or not text:
+            return []
+        _, _, trie, _ = self._data
+        words = normalize(text).split()
+        found, i = [], 0
+        while i < len(words):
+            node, match, j = trie, None, i
+            while j < len(words) and words[j] in node:
+                node = node[words[j]]
+                j += 1
+                if _END in node:
+                    match = (node[_END], j)
+            if match is None:
+                i += 1
+                continue
+            if match[0] not in found:
+                found.append(match[0])
+            i = match[1]
+        return found
+
+    def interactions(self, drug_ids):
+        """Recorded interactions between the given drug ids, most severe first."""
+        if self._data is None:
+            return []
+        drugs, _, _, interactions = self._data
+        ids = sorted(set(drug_ids))
+        found = []
+        for a, b in combinations(ids, 2):
+            entry = interactions.get((a, b))
+            if entry is not None:
+                found.append({"drugs": [drugs[a], drugs[b]], "level": entry[0], "description": entry[1]})
+        return sorted(found, key=lambda x: LEVEL_ORDER.get(x["level"].lower(), len(LEVEL_ORDER)))
+
+    def facts(self, drug_ids):
+        """Prompt block with the recognised drugs and their recorded interactions ("" if none)."""
+        drug_ids = list(dict.fromkeys(drug_ids))
+        if not drug_ids or self._data is None:
+            return ""
+        lines = [f"Recognised medications: {', '.join(self.name(i) for i in drug_ids)}."]
+        if len(drug_ids) > 1:
+            interactions = self.interactions(drug_ids)
+            if not interactions:
+                lines.append("No interaction between these medications is recorded in the reference database "
+                             "(this alone does not prove they are safe together).")
+            else:
+                lines.append("Known interactions (reference database):")
+            for item in interactions:
+                description = f" {item['description']}" if item["description"] else ""
+                lines.append(f"- {item['drugs'][0]} + {item['drugs'][1]}: {item['level']} interaction.{description}")
+        return "\n".join(lines)
+
+    def stats(self):
+        data = self._data
+        return {
+            "ready": data is not None,
+            "drugs": len(data[0]) if data else 0,
+            "names": len(data[1]) if data else 0,
+            "interactions": len(data[3]) if data else 0,
+            "load_seconds": round(self._load_seconds, 3) if self._load_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+drug_index = DrugIndex()
+
+
+# --- BUILD (from public dumps) ---
+
+def _column(row, *candidates):
+    """First non-empty value among the candidate columns (case-insensitive)."""
+    lowered = {k.strip().lower(): v for k, v in row.items() if k}
+    for name in candidates:
+        value = lowered.get(name)
+        if value and value.strip():
+            return value.strip()
+    return None
+
+
+class _Builder:
+    def __init__(self):
+        self.drugs = []       # canonical display names
+        self.names = {}       # normalised name -> drug id
+        self.interactions = {}
+
+    def add_drug(self, canonical, synonyms=()):
+        """Registers a drug (or merges it into the drug that already owns one of its names)."""
+        keys = [normalize(n) for n in [canonical, *synonyms] if n]
+        keys = [k for k in keys if len(k) >= MIN_NAME_LENGTH]
+        if not keys:
+            return None
+        drug_id = next((self.names[k] for k in keys if k in self.names), None)
+        if drug_id is None:
+            drug_id = len(self.drugs)
+            self.drugs.append(canonical.strip())
+        for key in keys:
+            self.names.setdefault(key, drug_id)
+        return drug_id
+
+    def add_interaction(self, drug_a, drug_b, level, description):
+        a = self.names.get(normalize(drug_a))
+        if a is None:
+            a = self.add_drug(drug_a)
+        b = self.names.get(normalize(drug_b))
+        if b is None:
+            b = self.add_drug(drug_b)
+        if a is None or b is None or a == b:
+            return
+        key = (a, b) if a < b else (b, a)
+        current = self.interactions.get(key)
+        level = (level or "Unknown").strip().capitalize()
+        # Several sources may list the pair: keep the most severe level
+        if current is None or LEVEL_ORDER.get(level.lower(), 9) < LEVEL_ORDER.get(current[0].lower(), 9):
+            self.interactions[key] = (level, (description or "").strip())
+
+    def payload(self, sources):
+        return {
+            "version": INDEX_VERSION,
+            "built": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sources": sources,
+            "drugs": self.drugs,
+            "names": self.names,
+            "interactions": [[a, b, level, description] for (a, b), (level, description) in self.interactions.items()],
+        }
+
+
+def _load_rxnorm(builder, path):
+    """
+    RxNorm RXNCONSO.RRF: names grouped by concept. When RXNREL.RRF sits next
+    to it, brand names are merged into their ingredient (tradename relations).
+    """
+    concepts = defaultdict(lambda: {"ingredient": None, "names": []})
+    with _open(path, "rt") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("|")
+            if len(fields) < 15 or fields[11] != "RXNORM" or fields[12] not in RXNORM_TERM_TYPES:
+                continue
+            concept = concepts[fields[0]]
+            concept["names"].append(fields[14])
+            if fields[12] in RXNORM_INGREDIENT_TYPES and concept["ingredient"] is None:
+                concept["ingredient"] = fields[14]
+
+    relations = os.path.join(os.path.dirname(path), "RXNREL.RRF")
+    if os.path.exists(relations):
+        with _open(relations, "rt") as f:
+            for line in f:
+                fields = line.split("|")
+                if len(fields) < 8 or fields[7] not in RXNORM_TRADENAME_RELATIONS:
+                    continue
+                first, second = concepts.get(fields[0]), concepts.get(fields[4])
+                if not first or not second:
+                    continue
+                ingredient, brand = (first, second) if first["ingredient"] else (second, first)
+                if ingredient["ingredient"] and not brand["ingredient"] and brand is not ingredient:
+                    ingredient["names"].extend(brand["names"])
+                    brand["names"] = []
+
+    # Ingredients first, so that each name goes to its ingredient rather than to a brand
+    for concept in sorted(concepts.values(), key=lambda c: c["ingredient"] is None):
+        if concept["names"]:
+            builder.add_drug(concept["ingredient"] or concept["names"][0], concept["names"])
+
+
+def _load_names(builder, path):
+    """CSV (name + synonyms columns) or JSONL ({"name", "synonyms"}) drug lists; RxNorm RRF files."""
+    if os.path.basename(path).upper().startswith("RXNCONSO"):
+        return _load_rxnorm(builder, path)
+    with _open(path, "rt") as f:
+        if ".jsonl" in path:
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            name = _column(row, "name", "drug", "drug_name", "generic_name")
+            synonyms = row.get("synonyms") or row.get("Synonyms") or []
+            if isinstance(synonyms, str):
+                synonyms = [s.strip() for s in synonyms.replace("|", ";").split(";")]
+            if name:
+                builder.add_drug(name, synonyms)
+
+
+def _load_interactions(builder, path):
+    """Pairwise interaction CSV, e.g. DDInter (Drug_A, Drug_B, Level) or drug_a/drug_b/level/description."""
+    with _open(path, "rt") as f:
+        for row in csv.DictReader(f):
+            drug_a = _column(row, "drug_a", "drug1", "drug 1", "drug1_name")
+            drug_b = _column(row, "drug_b", "drug2", "drug 2", "drug2_name")
+            if drug_a and drug_b:
+                builder.add_interaction(drug_a, drug_b, _column(row, "level", "severity"),
+                                        _column(row, "description", "interaction", "mechanism"))
+
+
+def build_index(name_paths, interaction_paths, output=None):
+    """Builds the index file from name/synonym dumps and interaction dumps; returns its stats."""
+    output = output or Config.DRUG_INDEX_PATH
+    builder = _Builder()
+    for path in name_paths:
+        _load_names(builder, path)
+    for path in interaction_paths:
+        _load_interactions(builder, path)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp = f"{output}.tmp"
+    with (gzip.open(tmp, "wt", encoding="utf-8") if output.endswith(".gz") else open(tmp, "wt", encoding="utf-8")) as f:
+        json.dump(builder.payload([os.path.basename(p) for p in [*name_paths, *interaction_paths]]), f,
+                  ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, output)
+    return {"output": output, "drugs": len(builder.drugs), "names": len(builder.names),
+            "interactions": len(builder.interactions)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MediMind drug index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build the drug name/interaction index from public dumps.")
+    build.add_argument("--names", nargs="*", default=[],
+                       help="Drug lists: RxNorm RXNCONSO.RRF, CSV (name, synonyms) or JSONL (.gz accepted)")
+    build.add_argument("--interactions", nargs="*", default=[],
+                       help="Interaction CSVs, e.g. DDInter (Drug_A, Drug_B, Level)")
+    build.add_argument("--output", default=Config.DRUG_INDEX_PATH)
+    lookup = commands.add_parser("lookup", help="Show the drugs and interactions found in a text.")
+    lookup.add_argument("text")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if not args.names and not args.interactions:
+            parser.error("build needs --names and/or --interactions")
+        print(json.dumps(build_index(args.names, args.interactions, args.output), indent=4))
+    elif args.command == "lookup":
+        drug_index.load()
+        start = time.perf_counter()
+        found = drug_index.find(args.text)
+        elapsed = (time.perf_counter() - start) * 1e6
+        print(json.dumps({"drugs": [drug_index.name(i) for i in found], "interactions": drug_index.interactions(found),
+                          "lookup_us": round(elapsed, 1)}, indent=4, ensure_ascii=False))
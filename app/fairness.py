@@ -1,3 +1,4 @@
+from typing import Optional
 from langchain_core.messages import HumanMessage
 from pydantic import BaseModel, Field
 from app.llm import get_llm
@@ -14,7 +15,7 @@ class FairnessAuditor:
         self.llm = get_llm(temperature=0.0)
         self.structured_llm = self.llm.with_structured_output(FairnessMetrics)
 
-    def audit_text(self, text: str) -> dict:
+    async def audit_text(self, text: str) -> Optional[dict]:
         prompt = f"""
         You are an AI Ethics Auditor. Analyze the following medical text for a patient.
         
@@ -28,15 +29,12 @@ class FairnessAuditor:
         
         try:
             # Uses Pydantic to force valid JSON every time
-            result = self.structured_llm.invoke([HumanMessage(content=prompt)])
+            result = await self.structured_llm.ainvoke([HumanMessage(content=prompt)])
             return result.model_dump()
             
         except Exception as e:
+            # No score is better than an invented one: the message stays unaudited
+            # (GET /api/fairness reports it as unavailable), including when the
+            # scheduler dropped the call because the LLM queue was full.
             print(f"Fairness Audit Error: {e}")
-            # Fallback only if LLM completely fails
-            return {
-                "toxicity_score": 0.0, 
-                "complexity_score": 5.0, 
-                "bias_detected": False, 
-                "reasoning": "Audit failed."
-            }
\ No newline at end of file
+            return None
@@ -1,5 +1,7 @@
 from langgraph.graph import StateGraph, END
 from app.state import MedicalAgentState
+from app.budget import is_exhausted, NODE_TOKEN_CAPS
+from app.telemetry import graph_telemetry
 from app.nodes import (
     supervisor_node,
     simple_medical_node,
@@ -8,17 +10,39 @@ from app.nodes import (
     translator_node,
     guardian_node,
     general_chat_node,
-    publisher_node 
+    publisher_node,
+    semantic_cache_node
 )
 
 def should_retry(state):
     status = state.get("safety_status", "APPROVED")
     count = state.get("iteration_count", 0)
     
-    if status == "REJECTED" and count < 3:
+    # A rewrite is only worth it if the budget still allows auditing it.
+    if status == "REJECTED" and count < 3 and not is_exhausted(state, min_tokens=NODE_TOKEN_CAPS["guardian"]):
         return "retry"
     return "finalize"
 
+def route_after_translator(state):
+    """Out of budget: publish the best draft so far without another audit."""
+    if is_exhausted(state):
+        return "publisher"
+    return "guardian"
+
+def route_after_supervisor(state):
+    step = state.get("next_step")
+    if step == "COMPLEX_MEDICAL":
+        return "semantic_cache"
+    if step == "SIMPLE_MEDICAL":
+        return "simple_medical"
+    return "general_chat"
+
+def route_after_cache(state):
+    """On a miss the Expert (RAG + facts) and the Profiler run in parallel."""
+    if state.get("cache_hit"):
+        return END
+    return ["medical_expert", "profiler"]
+
 def build_graph():
     workflow = StateGraph(MedicalAgentState)
 
@@ -28,6 +52,7 @@ def build_graph():
     workflow.add_node("simple_medical", simple_medical_node)
     
     # Complex Chain
+    workflow.add_node("semantic_cache", semantic_cache_node)
     workflow.add_node("medical_expert", medical_expert_node)
     workflow.add_node("profiler", profiler_node)
     workflow.add_node("translator", translator_node)
@@ -39,22 +64,22 @@ def build_graph():
     # 1. Supervisor Routing
     workflow.add_conditional_edges(
         "supervisor",
-        lambda x: x["next_step"],
-        {
-            "GENERAL_CHAT": "general_chat",
-            "SIMPLE_MEDICAL": "simple_medical",
-            "COMPLEX_MEDICAL": "medical_expert"
-        }
+        route_after_supervisor,
+        ["general_chat", "simple_medical", "semantic_cache"]
     )
 
     # 2. Simple & General -> End
     workflow.add_edge("simple_medical", END)
     workflow.add_edge("general_chat", END)
 
-    # 3. Complex Chain Flow
-    workflow.add_edge("medical_expert", "profiler")
-    workflow.add_edge("profiler", "translator")
-    workflow.add_edge("translator", "guardian")
+    # 3. Complex Chain Flow: cached answer, or Expert || Profiler joined before the Translator
+    workflow.add_conditional_edges(
+        "semantic_cache",
+        route_after_cache,
+        ["medical_expert", "profiler", END]
+    )
+    workflow.add_edge(["medical_expert", "profiler"], "translator")
+    workflow.add_conditional_edges("translator", route_after_translator, ["guardian", "publisher"])
 
     # 4. Guardian Loop
     workflow.add_conditional_edges(
@@ -69,6 +94,7 @@ def build_graph():
     # 5. Publisher -> End
     workflow.add_edge("publisher", END)
 
-    return workflow.compile()
+    # Node timings and token counts feed /metrics on every invocation
+    return workflow.compile().with_config(callbacks=[graph_telemetry])
 
 graph = build_graph()
\ No newline at end of file
@@ -1,23 +1,55 @@
+import httpx
 from langchain_openai import ChatOpenAI
 from app.config import Config
+from app.scheduler import scheduler
 import sys
 
-def get_llm(temperature=0.1):
+# Connection pools shared by every LLM client of the process, so concurrent
+# requests reuse keep-alive connections to Ollama instead of opening new ones.
+_POOL_LIMITS = httpx.Limits(max_connections=Config.LLM_MAX_CONNECTIONS, max_keepalive_connections=Config.LLM_MAX_CONNECTIONS)
+_TIMEOUT = httpx.Timeout(Config.LLM_TIMEOUT, connect=10.0)
+http_client = httpx.Client(limits=_POOL_LIMITS, timeout=_TIMEOUT)
+http_async_client = httpx.AsyncClient(limits=_POOL_LIMITS, timeout=_TIMEOUT)
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose requests wait for a slot of the LLM scheduler (at the caller's priority)."""
+
+    async def _agenerate(self, *args, **kwargs):
+        async with scheduler.slot(self.model_name):
+            return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        async with scheduler.slot(self.model_name):
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+
+def get_llm(temperature=0.1, max_tokens=None):
     """
-    Returns a configured LLM client.
+    Returns a configured LLM client (max_tokens caps the generated output).
     Fails gracefully if the server is unreachable.
     """
     try:
-        llm = ChatOpenAI(
+        llm = ScheduledChatOpenAI(
             base_url=Config.LLM_BASE_URL,
             api_key=Config.LLM_API_KEY,
             model=Config.LLM_MODEL,
             temperature=temperature,
+            # Sent as the plain "max_tokens" field: langchain would rename it to
+            # max_completion_tokens, which Ollama's OpenAI endpoint ignores.
+            extra_body={"max_tokens": max_tokens} if max_tokens else None,
             max_retries=2,
-            streaming=True
+            streaming=True,
+            stream_usage=True,  # Token counts also for streamed responses (request budgets)
+            http_client=http_client,
+            http_async_client=http_async_client
         )
         return llm
     except Exception as e:
         print(f"ERROR: Could not connect to LLM at {Config.LLM_BASE_URL}")
         print(f"Details: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+async def close_http_clients():
+    """Closes the shared connection pools (server shutdown)."""
+    http_client.close()
+    await http_async_client.aclose()
@@ -1,9 +1,18 @@
-import json
+import asyncio
 import logging
-import re
+from collections import OrderedDict
+from typing import Literal
+from pydantic import BaseModel, Field
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from app.config import Config
 from app.llm import get_llm
 from app.vector_store import query_trials
+from app.router import router
+from app.semantic_cache import semantic_cache
+from app.context import standalone_query
+from app.drug_index import drug_index
+from app.budget import ainvoke_within_budget, BudgetExhausted, budget_fallback
+from app.telemetry import GUARDIAN_VERDICTS, GUARDIAN_RETRIES
 
 # --- LOGGING SETUP ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -13,33 +22,24 @@ logger = logging.getLogger("MedicalAgentGraph")
 llm_strict = get_llm(temperature=0.1)   # For Logic/Facts/Safety
 llm_creative = get_llm(temperature=0.7) # For Tone/Empathy/Chat
 
-# --- HELPER: ROBUST JSON PARSER ---
-def extract_and_parse_json(text):
-    text = text.strip()
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-    try:
-        match = re.search(r"(\{.*\})", text, re.DOTALL)
-        if match:
-            json_str = match.group(1)
-            json_str = re.sub(r",\s*\}", "}", json_str)
-            return json.loads(json_str)
-    except:
-        pass
-    try:
-        if "```json" in text:
-            pattern = r"```json(.*?)```"
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                return json.loads(match.group(1).strip())
-    except:
-        pass
-    return None
+# --- STRUCTURED OUTPUTS (constrained decoding, no free-form JSON to parse) ---
+class SupervisorDecision(BaseModel):
+    next_step: Literal["GENERAL_CHAT", "SIMPLE_MEDICAL", "COMPLEX_MEDICAL"]
+
+class GuardianVerdict(BaseModel):
+    status: Literal["APPROVED", "REJECTED"]
+    feedback: str = Field(..., description="One short sentence: what to fix, or 'OK'.")
+
+# JSON-schema mode: the server can only emit a valid object, so these calls
+# generate a few dozen tokens and are never wasted on an unparsable answer.
+# include_raw: the raw message carries the token usage counted against the budget.
+supervisor_llm = get_llm(temperature=0.0, max_tokens=Config.SUPERVISOR_MAX_TOKENS).with_structured_output(
+    SupervisorDecision, method="json_schema", include_raw=True)
+guardian_llm = get_llm(temperature=0.0, max_tokens=Config.GUARDIAN_MAX_TOKENS).with_structured_output(
+    GuardianVerdict, method="json_schema", include_raw=True)
 
 # --- 1. SUPERVISOR (Strict) ---
-def supervisor_node(state):
+async def supervisor_node(state):
     logger.info("--- 🕵️ SUPERVISOR AGENT STARTED ---")
     
     messages = state.get("messages", [])
@@ -51,6 +51,16 @@ def supervisor_node(state):
             
     logger.info(f"Analyzing User Query: '{query}'")
     
+    # Fast path: local embedding classifier, the LLM is only asked when unsure
+    try:
+        fast_decision = await asyncio.to_thread(router.classify, query)
+    except Exception as e:
+        logger.error(f"Fast Router Error: {e}")
+        fast_decision = None
+    if fast_decision:
+        logger.info(f"Supervisor Decision (fast path): {fast_decision}")
+        return {"next_step": fast_decision, "iteration_count": 0}
+    
     system_prompt = """
     You are a JSON Classification Engine.
     TASK: Classify the input text into exactly ONE category.
@@ -72,25 +82,24 @@ def supervisor_node(state):
     """
     
     try:
-        resp = llm_strict.invoke([SystemMessage(content=system_prompt), HumanMessage(content=query)])
-        decision = extract_and_parse_json(resp.content)
-        
-        if not decision or "next_step" not in decision:
-            q_lower = query.lower()
-            if any(x in q_lower for x in ['medicament', 'drug', 'symptom', 'pain', 'mix', 'mélanger']):
-                return {"next_step": "COMPLEX_MEDICAL", "iteration_count": 0}
-            return {"next_step": "GENERAL_CHAT", "iteration_count": 0}
-            
-        next_step = decision.get("next_step", "GENERAL_CHAT")
+        decision, tokens = await ainvoke_within_budget(
+            supervisor_llm, [SystemMessage(content=system_prompt), HumanMessage(content=query)],
+            state, "supervisor", structured=True)
+        next_step = decision.next_step
+        router.record_llm_decision(next_step)
         logger.info(f"Supervisor Decision: {next_step}")
-        return {"next_step": next_step, "iteration_count": 0}
+        return {"next_step": next_step, "iteration_count": 0, "tokens_used": tokens}
         
     except Exception as e:
+        # Only reached when the LLM itself is unavailable (or out of budget): keyword fallback
         logger.error(f"Supervisor Error: {e}")
+        q_lower = query.lower()
+        if any(x in q_lower for x in ['medicament', 'drug', 'symptom', 'pain', 'mix', 'mélanger']):
+            return {"next_step": "COMPLEX_MEDICAL", "iteration_count": 0}
         return {"next_step": "GENERAL_CHAT", "iteration_count": 0}
 
 # --- NEW: SIMPLE MEDICAL NODE ---
-def simple_medical_node(state):
+async def simple_medical_node(state):
     logger.info("--- ⚡ SIMPLE MEDICAL AGENT STARTED ---")
     messages = state.get("messages", [])
     language = state.get("user_profile", {}).get("language", "English")
@@ -103,11 +112,32 @@ def simple_medical_node(state):
     1. **NO INTRODUCTIONS**: Do NOT say "Hello", "I am an AI", or "Here is the answer".
     2. **START IMMEDIATELY**: Begin directly with the medical explanation.
     """
-    response = llm_creative.invoke([SystemMessage(content=prompt)] + messages[-3:])
-    return {"messages": [response]}
+    try:
+        response, tokens = await ainvoke_within_budget(
+            llm_creative, [SystemMessage(content=prompt)] + messages[-3:], state, "simple_medical")
+    except BudgetExhausted:
+        logger.warning("Simple Medical: request budget exhausted")
+        return {"messages": [AIMessage(content=budget_fallback(state))]}
+    return {"messages": [response], "tokens_used": tokens}
+
+# --- NEW: SEMANTIC CACHE (Complex Chain entry) ---
+async def semantic_cache_node(state):
+    # Answers are shared across sessions, so only self-contained questions are served
+    query = standalone_query(state.get("messages", []))
+    if query is None:
+        return {"cache_hit": False}
+    try:
+        cached = await asyncio.to_thread(semantic_cache.lookup, query, state.get("user_profile", {}))
+    except Exception as e:
+        logger.error(f"Semantic Cache Lookup Failed: {e}")
+        cached = None
+    if cached is None:
+        return {"cache_hit": False}
+    logger.info("--- ♻️ SEMANTIC CACHE HIT ---")
+    return {"cache_hit": True, "messages": [AIMessage(content=cached)]}
 
 # --- 2. MEDICAL EXPERT (Strict + List Handling Fix) ---
-def medical_expert_node(state):
+async def medical_expert_node(state):
     logger.info("--- 🔬 MEDICAL EXPERT AGENT STARTED ---")
     
     messages = state.get("messages", [])
@@ -116,7 +146,7 @@ def medical_expert_node(state):
     # 1. Try RAG
     logger.info("Querying Vector Store (RAG)...")
     try:
-        retrieved_data = query_trials(query)
+        retrieved_data = await asyncio.to_thread(query_trials, query)
         
         # --- FIX FOR "LIST HAS NO ATTRIBUTE STRIP" ---
         if isinstance(retrieved_data, list):
@@ -142,6 +172,10 @@ def medical_expert_node(state):
         rag_content = retrieved
         logger.info(f"RAG Retrieved Context.")
     
+    # Drugs named in the query and their recorded interactions (local index, microseconds)
+    drug_facts = drug_index.facts(drug_index.find(query))
+    drug_section = f"\n    [DRUG INDEX]:\n{drug_facts}\n" if drug_facts else ""
+    
     # 3. Call LLM
     prompt = f"""
     You are a Senior Medical Researcher. 
@@ -150,39 +184,68 @@ def medical_expert_node(state):
     [USER QUERY]: "{query}"
     [RAG STATUS]: {rag_status}
     [RAG CONTENT]: {rag_content}
-    
+    {drug_section}
     CRITICAL INSTRUCTIONS:
     1. If RAG content is available, use it.
     2. **IF RAG IS EMPTY, YOU MUST USE YOUR OWN GENERAL MEDICAL KNOWLEDGE.**
     3. Do NOT say "I cannot answer" or "I need documents". Answer the question directly.
     4. Provide standard medical facts (Interactions, Contraindications, Usage).
+    5. Interactions listed in [DRUG INDEX] come from a reference database: always report them, with their level.
     
     Output the raw facts now.
     """
     
-    facts_response = llm_strict.invoke([HumanMessage(content=prompt)])
-    facts = facts_response.content
-    
-    # 4. Emergency Fallback
-    if "cannot" in facts.lower() and ("context" in facts.lower() or "document" in facts.lower()):
-        logger.warning("Expert refused to answer. Retrying with Creative Fallback.")
-        retry_prompt = f"Answer this medical question using general knowledge: {query}"
-        facts_response = llm_creative.invoke([HumanMessage(content=retry_prompt)])
+    used = 0
+    try:
+        facts_response, used = await ainvoke_within_budget(llm_strict, [HumanMessage(content=prompt)], state, "medical_expert")
         facts = facts_response.content
+        
+        # 4. Emergency Fallback
+        if "cannot" in facts.lower() and ("context" in facts.lower() or "document" in facts.lower()):
+            logger.warning("Expert refused to answer. Retrying with Creative Fallback.")
+            retry_prompt = f"Answer this medical question using general knowledge: {query}"
+            spent = {**state, "tokens_used": state.get("tokens_used", 0) + used}
+            facts_response, tokens = await ainvoke_within_budget(
+                llm_creative, [HumanMessage(content=retry_prompt)], spent, "medical_expert")
+            facts = facts_response.content
+            used += tokens
+    except BudgetExhausted:
+        logger.warning("Medical Expert: request budget exhausted")
+        facts = "\n\n".join(part for part in (rag_content if rag_status == "CONTEXT_AVAILABLE" else "", drug_facts) if part)
 
     logger.info(f"Medical Facts Extracted: {facts[:50]}...")
-    return {"medical_facts": facts}
+    return {"medical_facts": facts, "tokens_used": used}
 
 # --- 3. PROFILER (Creative) ---
-def profiler_node(state):
+# The strategy only depends on the profile, so it is computed once per
+# (age, language, literacy) and reused by every later request of that profile.
+_strategy_cache = OrderedDict()
+
+async def profiler_node(state):
     logger.info("--- 👤 PROFILER AGENT STARTED ---")
     profile = state.get("user_profile", {})
-    prompt = f"Define a communication strategy for: Age {profile.get('age')}, Lang {profile.get('language')}."
-    strategy = llm_creative.invoke([HumanMessage(content=prompt)]).content
-    return {"cultural_strategy": strategy}
+    key = (profile.get('age'), profile.get('language'), profile.get('literacy_level'))
+    if key in _strategy_cache:
+        _strategy_cache.move_to_end(key)
+        logger.info("Profiler Strategy Cache Hit")
+        return {"cultural_strategy": _strategy_cache[key]}
+    
+    prompt = f"Define a communication strategy for: Age {key[0]}, Lang {key[1]}, Literacy level {key[2]}."
+    try:
+        response, tokens = await ainvoke_within_budget(llm_creative, [HumanMessage(content=prompt)], state, "profiler")
+    except BudgetExhausted:
+        # Not cached: the next request of this profile gets a real strategy.
+        logger.warning("Profiler: request budget exhausted")
+        return {"cultural_strategy": f"Warm, plain {key[1]} adapted to a {key[0]}-year-old patient."}
+    strategy = response.content
+    
+    _strategy_cache[key] = strategy
+    if len(_strategy_cache) > Config.PROFILER_CACHE_SIZE:
+        _strategy_cache.popitem(last=False)
+    return {"cultural_strategy": strategy, "tokens_used": tokens}
 
 # --- 4. TRANSLATOR (Creative + Diagrams + Clean Output) ---
-def translator_node(state):
+async def translator_node(state):
     logger.info("--- ✍️ TRANSLATOR AGENT STARTED ---")
     facts = state["medical_facts"]
     strategy = state["cultural_strategy"]
@@ -204,11 +267,20 @@ def translator_node(state):
     
     Draft response:
     """
-    response = llm_creative.invoke([SystemMessage(content=prompt)])
-    return {"draft_response": response.content}
+    try:
+        response, tokens = await ainvoke_within_budget(llm_creative, [SystemMessage(content=prompt)], state, "translator")
+    except BudgetExhausted:
+        # Keep the best draft so far; the graph goes straight to the publisher.
+        logger.warning("Translator: request budget exhausted")
+        return {}
+    if response.response_metadata.get("finish_reason") == "length" and state.get("draft_response"):
+        # A rewrite cut off by the token cap is worse than the previous complete draft.
+        logger.warning("Translator: rewrite truncated, keeping the previous draft")
+        return {"tokens_used": tokens}
+    return {"draft_response": response.content, "tokens_used": tokens}
 
 # --- 5. GUARDIAN (Strict) ---
-def guardian_node(state):
+async def guardian_node(state):
     logger.info("--- 🛡️ GUARDIAN AGENT STARTED ---")
     facts = state["medical_facts"]
     draft = state["draft_response"]
@@ -222,23 +294,37 @@ def guardian_node(state):
     """
     
     try:
-        resp = llm_strict.invoke([HumanMessage(content=prompt)])
-        analysis = extract_and_parse_json(resp.content)
-        if not analysis: return {"safety_status": "APPROVED", "iteration_count": 99}
-        
-        status = analysis.get("status", "REJECTED")
-        logger.info(f"Guardian Status: {status}")
-        return {"safety_status": status, "critique_feedback": analysis.get("feedback", "N/A"), "iteration_count": state["iteration_count"] + 1}
-    except:
-        return {"safety_status": "APPROVED", "iteration_count": 99}
+        verdict, tokens = await ainvoke_within_budget(guardian_llm, [HumanMessage(content=prompt)], state, "guardian", structured=True)
+    except Exception as e:
+        # The LLM is unavailable or the budget is spent: publish the draft, but
+        # flagged as unverified (it is not retried and never enters the semantic cache).
+        logger.error(f"Guardian Error: {e!r}")
+        GUARDIAN_VERDICTS.inc(status="UNVERIFIED")
+        return {"safety_status": "UNVERIFIED", "critique_feedback": "N/A", "iteration_count": state["iteration_count"] + 1}
+    
+    logger.info(f"Guardian Status: {verdict.status}")
+    GUARDIAN_VERDICTS.inc(status=verdict.status)
+    return {"safety_status": verdict.status, "critique_feedback": verdict.feedback,
+            "iteration_count": state["iteration_count"] + 1, "tokens_used": tokens}
 
 # --- 6. PUBLISHER (Required for Complex Chain) ---
-def publisher_node(state):
+async def publisher_node(state):
     """
     Takes the final draft and appends it to the conversation history.
+    Guardian-approved answers to self-contained questions (see
+    standalone_query) are also added to the semantic cache.
     """
     logger.info("--- 📤 PUBLISHING FINAL RESPONSE ---")
-    final_text = state["draft_response"]
+    # Best answer available: the draft, or the raw facts if the budget ran out before one was written
+    final_text = state.get("draft_response") or state.get("medical_facts") or budget_fallback(state)
+    if state.get("iteration_count"):
+        GUARDIAN_RETRIES.observe(state["iteration_count"] - 1)
+    query = standalone_query(state.get("messages", []))
+    if state.get("safety_status") == "APPROVED" and query is not None:
+        try:
+            await asyncio.to_thread(semantic_cache.store, query, state.get("user_profile", {}), final_text)
+        except Exception as e:
+            logger.error(f"Semantic Cache Store Failed: {e}")
     return {"messages": [AIMessage(content=final_text)]}
 
 # --- 7. VISUALIZER (Unused) ---
@@ -246,7 +332,11 @@ def visualizer_node(state):
     return {}
 
 # --- 8. GENERAL CHAT (Creative) ---
-def general_chat_node(state):
+async def general_chat_node(state):
     logger.info("--- 💬 GENERAL CHAT AGENT STARTED ---")
-    response = llm_creative.invoke(state["messages"])
-    return {"messages": [response]}
\ No newline at end of file
+    try:
+        response, tokens = await ainvoke_within_budget(llm_creative, state["messages"], state, "general_chat")
+    except BudgetExhausted:
+        logger.warning("General Chat: request budget exhausted")
+        return {"messages": [AIMessage(content=budget_fallback(state))]}
+    return {"messages": [response], "tokens_used": tokens}
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from app.config import Config
+
+
+class OCRCache:
+    """
+    On-disk cache of page extractions, addressed by the SHA-256 of the
+    normalised page bytes (the JPEG produced by app.vision, or the embedded
+    text of a text page) plus the model name and the prompt version.
+    Each entry stores the raw extraction and the parsed "medicaments" list.
+    The directory is bounded to Config.OCR_CACHE_MAX_BYTES: the least recently
+    used entries (file mtime, refreshed on every hit) are evicted first.
+    """
+
+    def __init__(self, directory=Config.OCR_CACHE_DIR, max_bytes=Config.OCR_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # Computed lazily by the first store
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bytes_saved": 0}
+
+    @staticmethod
+    def key(page_bytes, model, prompt_version):
+        digest = hashlib.sha256(page_bytes)
+        digest.update(f"\0{model}\0{prompt_version}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key, page_size=0):
+        """Returns the cached entry ({"text", "medicaments"}) or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # LRU: a hit makes the entry recent again
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+        self._count("hits")
+        self._count("bytes_saved", page_size)
+        return entry
+
+    def put(self, key, text, medicaments):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({"text": text, "medicaments": medicaments, "created_at": time.time()}, ensure_ascii=False)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        replaced = os.path.exists(path)
+        os.replace(tmp_path, path)
+        self._count("stores")
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            elif not replaced:
+                self._size += len(data.encode("utf-8"))
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+                "size_bytes": self._size,
+            }
+
+    def _evict(self):
+        """Removes the oldest entries until the cache is back to 90% of its budget."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+            self._stats["evictions"] += 1
+
+    def _entries(self):
+        """(path, size, mtime) of every cache entry."""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+
+ocr_cache = OCRCache()
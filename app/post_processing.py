@@ -0,0 +1,88 @@
+import asyncio
+from langchain_core.messages import HumanMessage, AIMessage
+from app.config import Config
+from app.fairness import FairnessAuditor
+from app.llm import get_llm
+from app.scheduler import at_priority, Priority
+from app.vector_store import save_message_fairness, update_session_title
+from app.context import update_summary
+
+auditor = FairnessAuditor()
+llm = get_llm()
+
+# --- TITLE GENERATION ---
+async def generate_title(history):
+    """Short title of the conversation, or None if it could not be generated."""
+    try:
+        messages = []
+        for msg in history[-4:]: 
+            if msg['role'] == 'user': messages.append(HumanMessage(content=msg['content']))
+            elif msg['role'] == 'assistant': messages.append(AIMessage(content=msg['content']))
+        
+        prompt = "Génère un titre de 3-4 mots maximum résumant cette conversation médicale ou ce document. Réponds uniquement avec le titre."
+        messages.append(HumanMessage(content=prompt))
+        
+        response = await llm.ainvoke(messages)
+        title = response.content.strip().replace('"', '').replace("'", "")
+        return title if len(title) < 50 else title[:50]
+    except Exception as e:
+        # Keep the current title rather than saving a placeholder for good
+        # (e.g. SchedulerBusy: the LLM queue was full and the call was dropped).
+        print(f"Title Gen Error: {e}")
+        return None
+
+# --- POST-RESPONSE PIPELINE ---
+class PostResponsePipeline:
+    """
+    Work that follows an answer but must not delay it: the fairness audit,
+    the session title and the rolling summary of old turns. The LLM calls of
+    a job run concurrently, and at most
+    Config.POST_PROCESS_CONCURRENCY jobs run at once. Their LLM calls are
+    scheduled below interactive answers and OCR (app.scheduler), so that
+    background audits cannot starve interactive chats on the shared Ollama.
+    Results are persisted with the message; callers may also await the job.
+    A step that fails (or is dropped by the scheduler) saves nothing.
+    """
+
+    def __init__(self, max_concurrency=Config.POST_PROCESS_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._jobs = {}
+
+    def submit(self, session_id, message_id, text, history, audit=True, title=False, summarize=True):
+        """Schedules the job of a stored message and returns its task."""
+        task = asyncio.create_task(self._run(session_id, message_id, text, history, audit, title, summarize))
+        self._jobs[message_id] = task
+        task.add_done_callback(lambda _: self._jobs.pop(message_id, None))
+        return task
+
+    def is_pending(self, message_id):
+        return message_id in self._jobs
+
+    async def drain(self):
+        """Waits for the jobs still queued or running."""
+        while self._jobs:
+            await asyncio.gather(*list(self._jobs.values()), return_exceptions=True)
+
+    async def shutdown(self):
+        """Cancels the jobs still queued or running (server shutdown)."""
+        for task in list(self._jobs.values()):
+            task.cancel()
+        await asyncio.gather(*self._jobs.values(), return_exceptions=True)
+
+    async def _run(self, session_id, message_id, text, history, audit, title, summarize):
+        async with self._semaphore:
+            metrics, new_title, _ = await asyncio.gather(
+                at_priority(Priority.AUDIT, auditor.audit_text(text)) if audit else _none(),
+                at_priority(Priority.TITLE, generate_title(history)) if title else _none(),
+                at_priority(Priority.AUDIT, update_summary(session_id, llm)) if summarize else _none(),
+            )
+        if metrics is not None:
+            await asyncio.to_thread(save_message_fairness, message_id, metrics)
+        if new_title is not None:
+            await asyncio.to_thread(update_session_title, session_id, new_title)
+        return {"fairness": metrics, "title": new_title}
+
+async def _none():
+    return None
+
+pipeline = PostResponsePipeline()
@@ -0,0 +1,101 @@
+import threading
+import numpy as np
+from app.config import Config
+from app.vector_store import vector_store
+
+# Labelled example queries for each supervisor category (FR / EN / ES).
+EXAMPLE_QUERIES = {
+    "GENERAL_CHAT": [
+        "Bonjour", "Salut, ça va ?", "Merci beaucoup", "Au revoir", "J'ai une question",
+        "Hello", "Hi there", "Thank you", "Goodbye", "I have a question", "Who are you?",
+        "Hola", "Gracias", "Adiós", "Tengo una pregunta",
+    ],
+    "SIMPLE_MEDICAL": [
+        "Qu'est-ce que le diabète ?", "C'est quoi la tension artérielle ?", "Des conseils contre la grippe ?",
+        "Comment bien dormir ?", "Qu'est-ce qu'un antibiotique ?",
+        "What is asthma?", "What is cholesterol?", "Tips for the flu", "How much water should I drink a day?",
+        "What does an anti-inflammatory do?",
+        "¿Qué es la hipertensión?", "Consejos para el resfriado",
+    ],
+    "COMPLEX_MEDICAL": [
+        "Puis-je mélanger le paracétamol et l'ibuprofène ?", "Je prends du Doliprane et de l'alcool, est-ce dangereux ?",
+        "J'ai mal à la poitrine depuis deux jours et je suis essoufflé", "Mon enfant a de la fièvre et des boutons",
+        "Est-ce que ce médicament est compatible avec ma grossesse ?", "Que veut dire la posologie sur mon ordonnance ?",
+        "Can I take ibuprofen with my blood pressure medication?", "Can I mix amoxicillin and alcohol?",
+        "I have had a headache and blurred vision for three days", "Is it safe to take aspirin while on warfarin?",
+        "What does the dosage on my prescription mean?",
+        "¿Puedo mezclar paracetamol e ibuprofeno?", "Tengo dolor de estómago y fiebre desde ayer",
+    ],
+}
+
+
+class QueryRouter:
+    """
+    Fast path in front of the Supervisor LLM: nearest-centroid classification
+    over the RAG embedding model. A query is routed locally only when the best
+    centroid beats the runner-up by Config.ROUTER_MIN_MARGIN; otherwise the
+    caller asks the LLM. Counts how often each path is taken.
+    """
+
+    def __init__(self, examples=EXAMPLE_QUERIES, min_margin=Config.ROUTER_MIN_MARGIN):
+        self.examples = examples
+        self.min_margin = min_margin
+        self._labels = None
+        self._centroids = None
+        self._lock = threading.Lock()
+        self._counts = {"fast_path": 0, "llm_path": 0}
+        self._decisions = {label: 0 for label in examples}
+
+    def classify(self, query: str):
+        """Returns the category, or None when the query should go to the LLM."""
+        label = self._classify(query)
+        with self._lock:
+            if label is None:
+                self._counts["llm_path"] += 1
+            else:
+                self._counts["fast_path"] += 1
+                self._decisions[label] += 1
+        return label
+
+    def record_llm_decision(self, label: str):
+        with self._lock:
+            self._decisions[label] = self._decisions.get(label, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            total = self._counts["fast_path"] + self._counts["llm_path"]
+            return {
+                **self._counts,
+                "fast_path_ratio": self._counts["fast_path"] / total if total else 0.0,
+                "decisions": dict(self._decisions),
+            }
+
+    def _classify(self, query):
+        # Never block a request on the embedding model still loading at startup.
+        if not query.strip() or not vector_store.ready:
+            return None
+        _, embedding_func = vector_store.get()
+        if self._centroids is None:
+            self._fit(embedding_func)
+
+        query_vec = np.asarray(vector_store.embed_query(query))
+        scores = self._centroids @ (query_vec / np.linalg.norm(query_vec))
+        best, runner_up = np.argsort(scores)[::-1][:2]
+        if scores[best] - scores[runner_up] < self.min_margin:
+            return None
+        return self._labels[best]
+
+    def _fit(self, embedding_func):
+        with self._lock:
+            if self._centroids is not None:
+                return
+            labels, centroids = [], []
+            for label, queries in self.examples.items():
+                vectors = np.asarray(embedding_func.embed_documents(queries))
+                centroid = vectors.mean(axis=0)
+                labels.append(label)
+                centroids.append(centroid / np.linalg.norm(centroid))
+            self._labels, self._centroids = labels, np.vstack(centroids)
+
+
+router = QueryRouter()
@@ -0,0 +1,185 @@
+import math
+import time
+import asyncio
+import itertools
+import contextvars
+from enum import IntEnum
+from contextlib import asynccontextmanager, contextmanager
+from app.config import Config
+from app.telemetry import LLM_QUEUE_DEPTH, LLM_IN_FLIGHT, LLM_QUEUE_WAIT_SECONDS, LLM_REJECTED
+
+
+class Priority(IntEnum):
+    """Order in which waiting LLM calls get a slot (lowest value first)."""
+    INTERACTIVE = 0  # Chat answers and upload explanations
+    OCR = 1          # Document pages (vision and text extraction)
+    AUDIT = 2        # Fairness audits and conversation summaries
+    TITLE = 3        # Session titles
+
+    @property
+    def label(self):
+        return self.name.lower()
+
+
+# Priority of the LLM calls made from the current task (chat answers unless set).
+current_priority = contextvars.ContextVar("llm_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority):
+    """LLM calls made inside the block are scheduled at this priority."""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+async def at_priority(priority, coro):
+    """Awaits coro with its LLM calls scheduled at this priority."""
+    with llm_priority(priority):
+        return await coro
+
+
+class SchedulerBusy(Exception):
+    """The model's queue is full; retry_after is a wait estimate in seconds."""
+
+    def __init__(self, model, retry_after):
+        super().__init__(f"LLM queue of {model} is full, retry in {retry_after}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class _ModelQueue:
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.active = 0
+        self.waiting = []             # [priority, seq, future], served lowest first
+        self.service_seconds = 2.0    # Moving average of the time a call holds its slot
+
+
+def _parse_concurrency(spec):
+    """'model=n,model=n' -> {model: n}"""
+    limits = {}
+    for item in spec.split(","):
+        model, _, value = item.strip().rpartition("=")
+        if model and value.isdigit() and int(value) > 0:
+            limits[model] = int(value)
+    return limits
+
+
+class LLMScheduler:
+    """
+    Single gate of every call to the local LLM server. Each model gets
+    Config.LLM_CONCURRENCY slots (Config.LLM_MODEL_CONCURRENCY overrides),
+    and calls waiting for one are served by priority, then in arrival order.
+    At most Config.LLM_QUEUE_LIMIT calls wait per model: beyond that, the
+    lowest-priority call (the newest one on ties) is refused with
+    SchedulerBusy. Interactive calls of requests already admitted are never
+    refused; new requests are turned away by admit() instead (HTTP 429).
+    Runs on the event loop; not thread-safe.
+    """
+
+    def __init__(self, concurrency=Config.LLM_CONCURRENCY, model_concurrency=Config.LLM_MODEL_CONCURRENCY,
+                 queue_limit=Config.LLM_QUEUE_LIMIT):
+        self._concurrency = concurrency
+        self._model_concurrency = _parse_concurrency(model_concurrency)
+        self._queue_limit = queue_limit
+        self._queues = {}
+        self._seq = itertools.count()
+
+    def _queue(self, model):
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self._model_concurrency.get(model, self._concurrency))
+        return queue
+
+    def retry_after(self, model):
+        """Seconds until the model's current queue has likely drained."""
+        queue = self._queue(model)
+        backlog = (len(queue.waiting) + queue.active) * queue.service_seconds / queue.concurrency
+        return max(1, min(60, math.ceil(backlog)))
+
+    def admit(self, model, priority=Priority.INTERACTIVE):
+        """Raises SchedulerBusy when a new request at this priority would not get a place in the queue."""
+        queue = self._queue(model)
+        ahead = sum(1 for p, _, _ in queue.waiting if p <= priority)
+        if ahead >= self._queue_limit:
+            LLM_REJECTED.inc(model=model, priority=priority.label)
+            raise SchedulerBusy(model, self.retry_after(model))
+
+    @asynccontextmanager
+    async def slot(self, model, priority=None):
+        """Holds one of the model's slots for the duration of the block."""
+        priority = Priority(current_priority.get() if priority is None else priority)
+        queue = self._queue(model)
+        start = time.perf_counter()
+        if queue.active < queue.concurrency and not queue.waiting:
+            queue.active += 1
+        else:
+            await self._wait(model, queue, priority)
+        acquired = time.perf_counter()
+        LLM_QUEUE_WAIT_SECONDS.observe(acquired - start, model=model, priority=priority.label)
+        LLM_IN_FLIGHT.set(queue.active, model=model)
+        try:
+            yield
+        finally:
+            queue.service_seconds += 0.2 * (time.perf_counter() - acquired - queue.service_seconds)
+            self._release(model, queue)
+
+    async def _wait(self, model, queue, priority):
+        if len(queue.waiting) >= self._queue_limit:
+            # (no waiter to compare with when the limit is 0)
+            worst = max(queue.waiting, key=lambda w: (w[0], w[1])) if queue.waiting else None
+            if worst is not None and worst[0] > priority:
+                # The newcomer outranks the last waiter: that one is refused instead
+                queue.waiting.remove(worst)
+                LLM_REJECTED.inc(model=model, priority=Priority(worst[0]).label)
+                worst[2].set_exception(SchedulerBusy(model, self.retry_after(model)))
+            elif priority != Priority.INTERACTIVE:
+                LLM_REJECTED.inc(model=model, priority=priority.label)
+                raise SchedulerBusy(model, self.retry_after(model))
+
+        entry = [priority, next(self._seq), asyncio.get_running_loop().create_future()]
+        queue.waiting.append(entry)
+        self._publish(model, queue)
+        try:
+            await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled() and entry[2].exception() is None:
+                self._release(model, queue)  # The slot was handed over just before the cancellation
+            elif entry in queue.waiting:
+                queue.waiting.remove(entry)
+            raise
+        finally:
+            self._publish(model, queue)
+
+    def _release(self, model, queue):
+        queue.active -= 1
+        while queue.waiting and queue.active < queue.concurrency:
+            entry = min(queue.waiting, key=lambda w: (w[0], w[1]))
+            queue.waiting.remove(entry)
+            if not entry[2].done():
+                entry[2].set_result(None)
+                queue.active += 1
+        LLM_IN_FLIGHT.set(queue.active, model=model)
+        self._publish(model, queue)
+
+    def _publish(self, model, queue):
+        for priority in Priority:
+            LLM_QUEUE_DEPTH.set(sum(1 for p, _, _ in queue.waiting if p == priority),
+                                model=model, priority=priority.label)
+
+    def stats(self):
+        return {
+            model: {
+                "concurrency": queue.concurrency,
+                "in_flight": queue.active,
+                "queued": {p.label: sum(1 for w in queue.waiting if w[0] == p) for p in Priority},
+                "avg_call_seconds": round(queue.service_seconds, 2),
+            }
+            for model, queue in self._queues.items()
+        }
+
+
+scheduler = LLMScheduler()
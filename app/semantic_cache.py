@@ -0,0 +1,142 @@
+import time
+import uuid
+import threading
+from app.config import Config
+from app.vector_store import vector_store, get_kb_version
+
+CACHE_COLLECTION = "response_cache"
+
+
+def age_band(age):
+    """Groups ages so that answers are only shared between comparable patients."""
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    if age < 12:
+        return "child"
+    if age < 18:
+        return "teen"
+    if age < 65:
+        return "adult"
+    return "senior"
+
+
+class SemanticCache:
+    """
+    Cache of Guardian-APPROVED answers, stored in a dedicated Chroma collection
+    (persistent, next to the knowledge base) and keyed by the query embedding
+    plus (language, literacy level, age band).
+    A lookup hits when the closest cached query is at least
+    Config.SEMANTIC_CACHE_THRESHOLD similar (cosine). Entries expire after
+    Config.SEMANTIC_CACHE_TTL seconds, the least recently used ones are evicted
+    beyond Config.SEMANTIC_CACHE_MAX_ENTRIES, and every entry is dropped when
+    the knowledge-base version changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kb_version = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def lookup(self, query, profile):
+        """Returns the cached answer for this query and profile, or None."""
+        if not Config.SEMANTIC_CACHE_ENABLED or not vector_store.ready:
+            return None
+        collection = self._collection()
+        if collection.count() == 0:
+            self._count("misses")
+            return None
+
+        results = collection.query(
+            query_embeddings=[vector_store.embed_query(query)],
+            n_results=1,
+            where=self._where(profile),
+            include=["documents", "metadatas", "distances"],
+        )
+        if not results["ids"] or not results["ids"][0]:
+            self._count("misses")
+            return None
+
+        entry_id = results["ids"][0][0]
+        metadata = results["metadatas"][0][0]
+        similarity = 1.0 - results["distances"][0][0]
+        now = time.time()
+        if now - metadata["created_at"] > Config.SEMANTIC_CACHE_TTL:
+            collection.delete(ids=[entry_id])
+            self._count("evictions")
+            self._count("misses")
+            return None
+        if similarity < Config.SEMANTIC_CACHE_THRESHOLD:
+            self._count("misses")
+            return None
+
+        collection.update(ids=[entry_id], metadatas=[{**metadata, "last_hit": now, "hits": metadata.get("hits", 0) + 1}])
+        self._count("hits")
+        return results["documents"][0][0]
+
+    def store(self, query, profile, answer):
+        """Caches an approved answer."""
+        if not Config.SEMANTIC_CACHE_ENABLED or not vector_store.ready:
+            return
+        collection = self._collection()
+        now = time.time()
+        collection.add(
+            ids=[str(uuid.uuid4())],
+            embeddings=[vector_store.embed_query(query)],
+            documents=[answer],
+            metadatas=[{
+                **self._key(profile),
+                "kb_version": self._kb_version,
+                "created_at": now,
+                "last_hit": now,
+                "hits": 0,
+            }],
+        )
+        self._count("stores")
+        if collection.count() > Config.SEMANTIC_CACHE_MAX_ENTRIES:
+            self._evict(collection)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0}
+
+    def _collection(self):
+        collection = vector_store.get_collection(CACHE_COLLECTION)
+        kb_version = get_kb_version()
+        if kb_version != self._kb_version:
+            # Answers were built on another knowledge base: drop them all.
+            stale = collection.get(where={"kb_version": {"$ne": kb_version}}, include=[])["ids"]
+            if stale:
+                collection.delete(ids=stale)
+                self._count("invalidations", len(stale))
+            self._kb_version = kb_version
+        return collection
+
+    def _evict(self, collection):
+        """Drops the least recently used tenth of the entries."""
+        entries = collection.get(include=["metadatas"])
+        by_last_hit = sorted(zip(entries["ids"], entries["metadatas"]), key=lambda e: e[1]["last_hit"])
+        excess = len(by_last_hit) - int(Config.SEMANTIC_CACHE_MAX_ENTRIES * 0.9)
+        victims = [entry_id for entry_id, _ in by_last_hit[:excess]]
+        if victims:
+            collection.delete(ids=victims)
+            self._count("evictions", len(victims))
+
+    def _key(self, profile):
+        return {
+            "language": str(profile.get("language", "")),
+            "literacy_level": str(profile.get("literacy_level", "")),
+            "age_band": age_band(profile.get("age")),
+        }
+
+    def _where(self, profile):
+        return {"$and": [{k: v} for k, v in self._key(profile).items()] + [{"kb_version": self._kb_version}]}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+
+semantic_cache = SemanticCache()
@@ -25,4 +25,9 @@ class MedicalAgentState(TypedDict):
     # --- Contrôle du flux ---
     iteration_count: int      # Pour éviter les boucles infinies de correction
     next_step: str            # Direction donnée par le Superviseur
-    safety_status: str        # "APPROVED" ou "REJECTED"
\ No newline at end of file
+    safety_status: str        # "APPROVED", "REJECTED" ou "UNVERIFIED" (Guardian indisponible)
+    cache_hit: bool           # Réponse servie par le cache sémantique
+    
+    # --- Budget de la requête ---
+    budget: Dict[str, float]                  # {max_tokens, started, deadline} (voir app/budget.py)
+    tokens_used: Annotated[int, operator.add]  # Tokens générés, additionnés par chaque nœud
\ No newline at end of file
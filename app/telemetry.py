@@ -0,0 +1,232 @@
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Prometheus text-format metrics, kept in process (no client library needed).
+# GET /metrics renders every metric registered below.
+
+logger = logging.getLogger("Telemetry")
+
+_registry = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name, self.documentation, self.labels = name, documentation, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labels = name, documentation, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series[-1]}")
+        return lines
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- METRICS ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to the response headers, by route.", ["method", "route", "status"])
+NODE_SECONDS = Histogram("graph_node_duration_seconds", "Wall time of each agent graph node.", ["node"])
+NODE_TOKENS = Counter("graph_node_tokens_total", "LLM tokens per graph node.", ["node", "kind"])
+GUARDIAN_VERDICTS = Counter("guardian_verdicts_total", "Guardian verdicts.", ["status"])
+GUARDIAN_RETRIES = Histogram(
+    "guardian_retries", "Translator rewrites requested by the Guardian, per answer.", buckets=(0, 1, 2, 3))
+RAG_SECONDS = Histogram("rag_query_duration_seconds", "Knowledge-base retrieval time (embedding + Chroma query).")
+VISION_PAGE_SECONDS = Histogram(
+    "vision_page_duration_seconds", "Time to read one document page.", ["source"])
+SESSION_STORE_SECONDS = Histogram(
+    "session_store_duration_seconds", "Session database operations.", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "LLM calls waiting for a slot.", ["model", "priority"])
+LLM_IN_FLIGHT = Gauge("llm_in_flight", "LLM calls holding a slot.", ["model"])
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds", "Time an LLM call waited for a slot.", ["model", "priority"])
+LLM_REJECTED = Counter("llm_rejected_total", "LLM calls refused because the queue was full.", ["model", "priority"])
+
+
+def timed(histogram, **labels):
+    """Decorator observing the duration of every call of a (sync) function."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- PER-REQUEST TRACES ---
+class Trace:
+    """What one request spent, node by node (logged when the request ends)."""
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.nodes = {}
+        self._lock = threading.Lock()
+
+    def add(self, node, seconds=0.0, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            entry = self.nodes.setdefault(node, {"seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "runs": 0})
+            entry["seconds"] += seconds
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["runs"] += 1 if seconds else 0
+
+    def summary(self):
+        with self._lock:
+            return {node: {**v, "seconds": round(v["seconds"], 3)} for node, v in self.nodes.items()}
+
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def start_trace(trace_id=None):
+    trace = Trace(trace_id)
+    current_trace.set(trace)
+    return trace
+
+
+class GraphTelemetry(BaseCallbackHandler):
+    """
+    Callback attached to the compiled graph: times every node run and counts
+    the prompt/completion tokens of the LLM calls made inside each node.
+    """
+
+    run_inline = True  # Timestamps taken on the event loop, not in an executor
+
+    def __init__(self):
+        self._nodes = {}      # run_id -> (node, start)
+        self._llm_nodes = {}  # run_id -> node
+
+    def on_chain_start(self, serialized, inputs, *, run_id, name=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and name == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        entry = self._nodes.pop(run_id, None)
+        if entry is None:
+            return
+        node, start = entry
+        seconds = time.perf_counter() - start
+        NODE_SECONDS.observe(seconds, node=node)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(node, seconds=seconds)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node:
+            self._llm_nodes[run_id] = node
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node = self._llm_nodes.pop(run_id, None)
+        if node is None:
+            return
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                else:
+                    # Structured (json_schema) responses only carry the raw OpenAI usage
+                    usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+                    prompt_tokens += usage.get("prompt_tokens") or 0
+                    completion_tokens += usage.get("completion_tokens") or 0
+        NODE_TOKENS.inc(prompt_tokens, node=node, kind="prompt")
+        NODE_TOKENS.inc(completion_tokens, node=node, kind="completion")
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(node, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._llm_nodes.pop(run_id, None)
+
+
+graph_telemetry = GraphTelemetry()
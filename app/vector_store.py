@@ -1,85 +1,699 @@
 import os
+import csv
 import json
+import time
+import hashlib
+import bisect
 import uuid
+import sqlite3
 import datetime
+import threading
+from collections import OrderedDict
+import queue
+from concurrent.futures import Future
 import torch
 import chromadb
 from langchain_huggingface import HuggingFaceEmbeddings
 from app.config import Config
+from app.telemetry import timed, RAG_SECONDS, SESSION_STORE_SECONDS
 
 # ==========================
 # PART 1: SESSION MANAGEMENT 
 # ==========================
-SESSION_FILE = "./data/sessions.json"
+# Sessions live in an embedded SQLite database (WAL mode): appending a
+# message is a single INSERT instead of a rewrite of the whole store.
+SESSION_FILE = "./data/sessions.json"  # Legacy store, only read by the migrator
+SESSION_DB = Config.SESSION_DB_PATH
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version).
+_SCHEMA_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        timestamp TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, seq);
+    """,
+    # v2: fairness audit of assistant messages, filled in after the response
+    """
+    ALTER TABLE messages ADD COLUMN fairness TEXT;
+    """,
+    # v3: rolling summary of the turns that no longer fit in the prompt
+    """
+    ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT '';
+    ALTER TABLE sessions ADD COLUMN summary_upto INTEGER NOT NULL DEFAULT 0;
+    """,
+    # v4: metadata index, so listing sessions never touches the messages table
+    """
+    ALTER TABLE sessions ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE sessions ADD COLUMN updated_at TEXT NOT NULL DEFAULT '';
+    UPDATE sessions SET
+        message_count = (SELECT COUNT(*) FROM messages WHERE messages.session_id = sessions.id),
+        updated_at = timestamp;
+    CREATE INDEX IF NOT EXISTS idx_sessions_listing ON sessions(message_count, timestamp);
+    """,
+    # v5: owner and creation epoch of each session. Bulk deletes only record a
+    # purge mark (every session with epoch <= upto is gone); the rows
+    # themselves are compacted in the background.
+    """
+    ALTER TABLE sessions ADD COLUMN user_id TEXT NOT NULL DEFAULT '';
+    ALTER TABLE sessions ADD COLUMN epoch INTEGER NOT NULL DEFAULT 0;
+    UPDATE sessions SET epoch = rowid;
+    CREATE INDEX IF NOT EXISTS idx_sessions_epoch ON sessions(epoch);
+    CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id, epoch);
+    CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    INSERT OR IGNORE INTO counters (name, value) VALUES ('session_epoch', COALESCE((SELECT MAX(epoch) FROM sessions), 0));
+    CREATE TABLE IF NOT EXISTS purge_marks (scope TEXT PRIMARY KEY, upto INTEGER NOT NULL);
+    """,
+]
+
+# A session is live unless a purge mark (global, or of its owner) covers its epoch.
+# Every read goes through this predicate, so a bulk delete is visible at once.
+_LIVE = (
+    "sessions.epoch > COALESCE((SELECT upto FROM purge_marks WHERE scope = '*'), 0) "
+    "AND sessions.epoch > COALESCE((SELECT upto FROM purge_marks WHERE scope = 'user:' || sessions.user_id), 0)"
+)
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _open_connection():
+    conn = sqlite3.connect(SESSION_DB, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # FULL: every commit is fsynced. The writer groups concurrent appends so
+    # that a burst of messages still costs a single fsync.
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def _connect():
+    """Returns the calling thread's read connection to the session database."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        ensure_session_file()
+        conn = _open_connection()
+        _local.conn = conn
+    _init_schema(conn)
+    return conn
+
+
+def _init_schema(conn):
+    """Applies pending schema migrations, then imports the legacy JSON store once."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        # The version is read inside the write transaction so that two workers
+        # starting together never apply the same migration twice.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, script in enumerate(_SCHEMA_MIGRATIONS[version:], start=version + 1):
+                for statement in script.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version={target}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _initialized = True
+    migrate_json_sessions()
+    _compactor.wake()  # Finishes a compaction interrupted by a restart
+
+
+# --- CONCURRENCY ---
+# Fixed set of lock stripes: memory stays constant however many sessions are
+# seen, at the cost of two sessions occasionally sharing a lock.
+_SESSION_LOCK_STRIPES = 64
+_session_locks = [threading.RLock() for _ in range(_SESSION_LOCK_STRIPES)]
+
+
+def session_lock(session_id):
+    """
+    Returns the in-process lock of a session.
+    Hold it around read-modify-write sequences (e.g. save, read history, retitle)
+    so that two requests on the same session cannot interleave.
+    Hold only one session's lock at a time: sessions share stripes.
+    """
+    return _session_locks[hash(session_id) % _SESSION_LOCK_STRIPES]
+
+
+class _SessionWriter:
+    """
+    Single writer thread for the session database.
+    Write operations are queued; everything queued while a commit is in
+    progress is applied in the next transaction (group commit), so N
+    concurrent appends cost one fsync instead of N. Each operation runs in
+    its own SAVEPOINT: a failing one is reported to its caller only.
+    """
+
+    MAX_BATCH = 256
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, operation):
+        """Runs operation(conn) on the writer thread and returns its result."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((operation, future))
+        return future.result()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                _connect()  # Runs schema migrations before the first write
+                self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        conn = _open_connection()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(conn, batch)
+
+    def _commit(self, conn, batch):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for operation, future in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    results.append((future, operation(conn), None))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        # Results are only published once the transaction is durable.
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_writer = _SessionWriter()
+
 
 def ensure_session_file():
-    """Ensures the data directory and sessions.json file exist."""
-    if not os.path.exists("./data"):
-        os.makedirs("./data")
-    if not os.path.exists(SESSION_FILE):
-        with open(SESSION_FILE, "w", encoding="utf-8") as f:
-            json.dump({}, f)
+    """Ensures the data directory exists."""
+    directory = os.path.dirname(SESSION_DB) or "."
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+
+def migrate_json_sessions(json_path=SESSION_FILE):
+    """
+    One-shot import of the legacy sessions.json into SQLite.
+    The JSON file is renamed to *.migrated afterwards so it is never imported twice.
+    Returns the number of imported sessions.
+    """
+    if not os.path.exists(json_path):
+        return 0
+
+    conn = _connect()
+    # The write lock is taken before reading the file: a second worker waits
+    # here and then finds the file already renamed.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not os.path.exists(json_path):
+            conn.execute("ROLLBACK")
+            return 0
+        with open(json_path, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+        for session_id, data in legacy.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions (id, title, timestamp, epoch) VALUES (?, ?, ?, ?)",
+                (session_id, data.get("title", "Nouvelle Conversation"), data.get("timestamp", ""), _next_epoch(conn)),
+            )
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, m["role"], m["content"]) for m in data.get("history", [])],
+            )
+            conn.execute(
+                "UPDATE sessions SET message_count = "
+                "(SELECT COUNT(*) FROM messages WHERE session_id = ?), updated_at = timestamp WHERE id = ?",
+                (session_id, session_id),
+            )
+        conn.execute("COMMIT")
+    except (OSError, ValueError) as e:
+        conn.execute("ROLLBACK")
+        print(f"Session Migration Error: {e}")
+        return 0
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    os.replace(json_path, json_path + ".migrated")
+    print(f"Migrated {len(legacy)} sessions from {json_path} into {SESSION_DB}")
+    return len(legacy)
 
+
+@timed(SESSION_STORE_SECONDS, operation="get_all_sessions")
 def get_all_sessions():
     """Returns the dictionary of all sessions."""
-    ensure_session_file()
+    conn = _connect()
+    conn.execute("BEGIN")  # Both reads see the same snapshot
     try:
-        with open(SESSION_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {}
+        sessions = {
+            row["id"]: {"title": row["title"], "timestamp": row["timestamp"], "history": []}
+            for row in conn.execute(f"SELECT id, title, timestamp FROM sessions WHERE {_LIVE}")
+        }
+        for row in conn.execute("SELECT session_id, role, content FROM messages ORDER BY seq"):
+            if row["session_id"] in sessions:
+                sessions[row["session_id"]]["history"].append({"role": row["role"], "content": row["content"]})
+    finally:
+        conn.execute("COMMIT")
+    return sessions
+
+
+@timed(SESSION_STORE_SECONDS, operation="list_sessions")
+def list_sessions(before=None, limit=None, user_id=None):
+    """
+    Returns the metadata of the non-empty sessions, most recent first:
+    [{id, title, timestamp, message_count, updated_at}]. Served from the
+    sessions table alone; no message is read.
+    before is the (timestamp, id) cursor of the last session of the previous page.
+    """
+    query = f"SELECT id, title, timestamp, message_count, updated_at FROM sessions WHERE message_count > 0 AND {_LIVE}"
+    params = []
+    if user_id is not None:
+        query += " AND user_id = ?"
+        params.append(user_id)
+    if before is not None:
+        query += " AND (timestamp, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY timestamp DESC, id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [dict(row) for row in _connect().execute(query, params)]
+
+
+@timed(SESSION_STORE_SECONDS, operation="sessions_stamp")
+def sessions_stamp(user_id=None):
+    """Changes whenever a session is added, updated, retitled or deleted (used as ETag)."""
+    query = f"SELECT COUNT(*), MAX(updated_at) FROM sessions WHERE message_count > 0 AND {_LIVE}"
+    params = ()
+    if user_id is not None:
+        query += " AND user_id = ?"
+        params = (user_id,)
+    row = _connect().execute(query, params).fetchone()
+    return (row[0], row[1] or "")
 
-def create_session(title="Nouvelle Conversation"):
-    """Creates a new session entry."""
-    sessions = get_all_sessions()
+
+@timed(SESSION_STORE_SECONDS, operation="session_stamp")
+def session_stamp(session_id):
+    """Changes whenever a message of the session is added or updated (used as ETag)."""
+    row = _connect().execute(
+        f"SELECT message_count, updated_at FROM sessions WHERE id = ? AND {_LIVE}", (session_id,)
+    ).fetchone()
+    return (row["message_count"], row["updated_at"]) if row else None
+
+
+def _next_epoch(conn):
+    return conn.execute(
+        "UPDATE counters SET value = value + 1 WHERE name = 'session_epoch' RETURNING value"
+    ).fetchone()[0]
+
+
+@timed(SESSION_STORE_SECONDS, operation="create_session")
+def create_session(title="Nouvelle Conversation", user_id=None):
+    """Creates a new session entry (optionally owned by user_id)."""
     session_id = str(uuid.uuid4())
-    sessions[session_id] = {
-        "title": title,
-        "timestamp": str(datetime.datetime.now()),
-        "history": []
-    }
-    with open(SESSION_FILE, "w", encoding="utf-8") as f:
-        json.dump(sessions, f, indent=4)
+    now = str(datetime.datetime.now())
+    _writer.submit(lambda conn: conn.execute(
+        "INSERT INTO sessions (id, title, timestamp, updated_at, user_id, epoch) VALUES (?, ?, ?, ?, ?, ?)",
+        (session_id, title, now, now, user_id or "", _next_epoch(conn)),
+    ))
     return session_id
 
+
+@timed(SESSION_STORE_SECONDS, operation="save_message_to_session")
 def save_message_to_session(session_id, role, content):
-    """Appends a message to the history."""
-    sessions = get_all_sessions()
-    if session_id in sessions:
-        sessions[session_id]["history"].append({"role": role, "content": content})
-        
-        with open(SESSION_FILE, "w", encoding="utf-8") as f:
-            json.dump(sessions, f, indent=4)
+    """Appends a message to the history. Returns its id (None if the session does not exist)."""
+    def insert(conn):
+        cursor = conn.execute(
+            "INSERT INTO messages (session_id, role, content) "
+            f"SELECT id, ?, ? FROM sessions WHERE id = ? AND {_LIVE}",
+            (role, content, session_id),
+        )
+        if not cursor.rowcount:
+            return None
+        message_id = cursor.lastrowid
+        _touch_session(conn, session_id, appended=1)
+        return message_id
+    try:
+        return _writer.submit(insert)
+    finally:
+        _history_cache.invalidate(session_id)
+
+
+@timed(SESSION_STORE_SECONDS, operation="save_message_fairness")
+def save_message_fairness(message_id, metrics):
+    """Attaches the fairness audit to a stored message."""
+    def update(conn):
+        row = conn.execute("SELECT session_id FROM messages WHERE seq = ?", (message_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE messages SET fairness = ? WHERE seq = ?",
+            (json.dumps(metrics, ensure_ascii=False), message_id),
+        )
+        _touch_session(conn, row["session_id"])
+        return row["session_id"]
+    session_id = _writer.submit(update)
+    if session_id is None:
+        return False
+    _history_cache.invalidate(session_id)
+    return True
+
+
+def _touch_session(conn, session_id, appended=0):
+    """Keeps the metadata index in step with the messages (same transaction)."""
+    conn.execute(
+        "UPDATE sessions SET message_count = message_count + ?, updated_at = ? WHERE id = ?",
+        (appended, str(datetime.datetime.now()), session_id),
+    )
+
+
+class _HistoryCache:
+    """
+    In-process LRU of the message lists of hot sessions.
+    Local writes invalidate their entry directly; an entry is also checked
+    against the (message_count, updated_at) pair of the metadata index, a
+    primary-key lookup, so writes made by another worker are never missed.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id, stamp):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return list(entry[1])
+
+    def peek(self, session_id, stamp):
+        """Like get(), but a session that is not hot is not a miss: the caller reads a window instead."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] != stamp:
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, session_id, stamp, history):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[session_id] = (stamp, list(history))
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
+    def invalidate(self, session_id=None):
+        with self._lock:
+            if session_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_history_cache = _HistoryCache(Config.SESSION_CACHE_SIZE)
+
+
+def _message_from_row(row):
+    message = {"id": row["seq"], "role": row["role"], "content": row["content"]}
+    if row["fairness"]:
+        message["fairness"] = json.loads(row["fairness"])
+    return message
+
+
+@timed(SESSION_STORE_SECONDS, operation="get_message")
+def get_message(message_id):
+    """Returns a single message, or None."""
+    row = _connect().execute(
+        "SELECT seq, role, content, fairness FROM messages JOIN sessions ON sessions.id = messages.session_id "
+        f"WHERE seq = ? AND {_LIVE}", (message_id,)
+    ).fetchone()
+    return _message_from_row(row) if row else None
+
+
+@timed(SESSION_STORE_SECONDS, operation="get_session_history")
 def get_session_history(session_id):
-    """Returns the message list for a specific session."""
-    sessions = get_all_sessions()
-    return sessions.get(session_id, {}).get("history", [])
+    """
+    Returns the message list for a specific session.
+    Hot sessions are served from memory; the messages are only re-read when
+    the session changed since they were cached. Treat the dicts as read-only.
+    """
+    conn = _connect()
+    conn.execute("BEGIN")  # The stamp and the messages come from the same snapshot
+    try:
+        meta = conn.execute(
+            f"SELECT message_count, updated_at FROM sessions WHERE id = ? AND {_LIVE}", (session_id,)
+        ).fetchone()
+        if meta is None:
+            return []
+        stamp = (meta["message_count"], meta["updated_at"])
+        history = _history_cache.get(session_id, stamp)
+        if history is None:
+            rows = conn.execute(
+                "SELECT seq, role, content, fairness FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            )
+            history = [_message_from_row(row) for row in rows]
+            _history_cache.put(session_id, stamp, history)
+    finally:
+        conn.execute("COMMIT")
+    return history
+
+
+@timed(SESSION_STORE_SECONDS, operation="get_session_page")
+def get_session_page(session_id, before=None, since=None, limit=None, include_system=False):
+    """
+    Returns (messages, has_more) for a window of a session, oldest first:
+      - since: the messages newer than that id (has_more: newer ones remain),
+      - before: the limit messages older than that id,
+      - neither: the limit most recent ones (has_more: older ones remain).
+    A hot session is cut from its cached history; otherwise only the window
+    is read (keyset range on the (session_id, seq) index) and nothing is cached.
+    """
+    conn = _connect()
+    conn.execute("BEGIN")  # The liveness check and the window come from the same snapshot
+    try:
+        meta = conn.execute(
+            f"SELECT message_count, updated_at FROM sessions WHERE id = ? AND {_LIVE}", (session_id,)
+        ).fetchone()
+        if meta is None:
+            return [], False
+        history = _history_cache.peek(session_id, (meta["message_count"], meta["updated_at"]))
+        if history is not None:
+            return _cut_page(history, before, since, limit, include_system)
+
+        query = "SELECT seq, role, content, fairness FROM messages WHERE session_id = ?"
+        params = [session_id]
+        if not include_system:
+            query += " AND role != 'system'"
+        if since is not None:
+            query += " AND seq > ? ORDER BY seq"
+            params.append(since)
+        else:
+            if before is not None:
+                query += " AND seq < ?"
+                params.append(before)
+            query += " ORDER BY seq DESC"
+        # One extra row tells whether more remain (-1: no limit)
+        rows = conn.execute(query + " LIMIT ?", (*params, limit + 1 if limit is not None else -1)).fetchall()
+    finally:
+        conn.execute("COMMIT")
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit] if has_more else rows
+    if since is None:
+        rows.reverse()
+    return [_message_from_row(row) for row in rows], has_more
+
+
+def _cut_page(history, before, since, limit, include_system):
+    if not include_system:
+        history = [m for m in history if m["role"] != "system"]
+    ids = [m["id"] for m in history]
+    if since is not None:
+        window = history[bisect.bisect_right(ids, since):]
+        if limit is not None and len(window) > limit:
+            return window[:limit], True
+        return window, False
+    end = bisect.bisect_left(ids, before) if before is not None else len(history)
+    start = max(0, end - limit) if limit is not None else 0
+    return history[start:end], start > 0
+
+
+def session_cache_stats():
+    """Hit/miss counters of the hot-session cache."""
+    return _history_cache.stats()
+
 
+@timed(SESSION_STORE_SECONDS, operation="get_session_summary")
+def get_session_summary(session_id):
+    """Returns (summary, id of the last message it covers)."""
+    row = _connect().execute(
+        f"SELECT summary, summary_upto FROM sessions WHERE id = ? AND {_LIVE}", (session_id,)
+    ).fetchone()
+    return (row["summary"], row["summary_upto"]) if row else ("", 0)
 
+
+@timed(SESSION_STORE_SECONDS, operation="save_session_summary")
+def save_session_summary(session_id, summary, summary_upto):
+    """Stores the rolling summary; never moves it backwards."""
+    return _writer.submit(
+        lambda conn: conn.execute(
+            "UPDATE sessions SET summary = ?, summary_upto = ? WHERE id = ? AND summary_upto < ?",
+            (summary, summary_upto, session_id, summary_upto),
+        ).rowcount > 0
+    )
+
+
+@timed(SESSION_STORE_SECONDS, operation="delete_session")
 def delete_session(session_id: str):
     """
-    Deletes a specific session from the JSON file.
+    Deletes a specific session and its messages.
     """
-    sessions = get_all_sessions()
-    if session_id in sessions:
-        del sessions[session_id]
-        with open(SESSION_FILE, "w", encoding="utf-8") as f:
-            json.dump(sessions, f, indent=4)
-        return True
-    return False
+    try:
+        return _writer.submit(
+            lambda conn: conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+        )
+    finally:
+        _history_cache.invalidate(session_id)
+
 
+@timed(SESSION_STORE_SECONDS, operation="update_session_title")
 def update_session_title(session_id: str, new_title: str):
     """
     Updates the title of a specific session.
     """
-    sessions = get_all_sessions()
-    if session_id in sessions:
-        sessions[session_id]["title"] = new_title
-        with open(SESSION_FILE, "w", encoding="utf-8") as f:
-            json.dump(sessions, f, indent=4, ensure_ascii=False)
+    def update(conn):
+        if not conn.execute(
+            f"UPDATE sessions SET title = ? WHERE id = ? AND {_LIVE}", (new_title, session_id)
+        ).rowcount:
+            return False
+        _touch_session(conn, session_id)
         return True
-    return False
+    return _writer.submit(update)
+
+
+@timed(SESSION_STORE_SECONDS, operation="delete_all_sessions")
+def delete_all_sessions(user_id=None):
+    """
+    Deletes every session (or every session of user_id) in constant time:
+    a single purge mark hides all the sessions created so far, whatever
+    their number. The rows are removed afterwards by the background compactor.
+    """
+    scope = "*" if user_id is None else f"user:{user_id}"
+    _writer.submit(lambda conn: conn.execute(
+        "INSERT INTO purge_marks (scope, upto) "
+        "VALUES (?, (SELECT value FROM counters WHERE name = 'session_epoch')) "
+        "ON CONFLICT(scope) DO UPDATE SET upto = excluded.upto",
+        (scope,),
+    ))
+    _history_cache.invalidate()
+    _compactor.wake()
+
+
+class _Compactor:
+    """
+    Background thread physically deleting purged sessions (and, by cascade,
+    their messages) in small batches, each one a separate writer operation
+    so that live appends are never held behind a large delete.
+    """
+
+    BATCH = 200
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.deleted = 0
+
+    def wake(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-compactor", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while True:
+                    removed = _writer.submit(self._delete_batch)
+                    self.deleted += removed
+                    if removed < self.BATCH:
+                        break
+            except Exception as e:
+                print(f"Session Compaction Error: {e}")
+
+    def _delete_batch(self, conn):
+        # One indexed range per purge mark rather than a scan of the live predicate.
+        removed = 0
+        for scope, upto in conn.execute("SELECT scope, upto FROM purge_marks").fetchall():
+            if scope == "*":
+                where, params = "epoch <= ?", (upto,)
+            else:
+                where, params = "user_id = ? AND epoch <= ?", (scope[len("user:"):], upto)
+            removed += conn.execute(
+                f"DELETE FROM sessions WHERE id IN (SELECT id FROM sessions WHERE {where} LIMIT ?)",
+                params + (self.BATCH - removed,),
+            ).rowcount
+            if removed >= self.BATCH:
+                break
+        return removed
+
+
+_compactor = _Compactor()
 
 # ==========================================
 # PART 2: VECTOR STORE (RAG & Medical Brain)
@@ -90,25 +704,158 @@ def get_device():
         return "cuda"
     return "cpu"
 
+class VectorStoreHandle:
+    """
+    Process-wide handle on the Chroma client and the embedding model.
+    Both are built once, on first use (or by warm_up() at server startup),
+    and shared by every request. reload() and shutdown() let the server swap
+    or release them explicitly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._collection = None
+        self._embedding_func = None
+        self._query_vectors = OrderedDict()
+        self._failed_at = None  # time.monotonic() of the last failed load
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._collection is not None
+
+    def get(self):
+        """Returns (collection, embedding_func), loading them if needed."""
+        # Read under the lock: reload() swaps both while holding it
+        with self._lock:
+            self._ensure_loaded()
+            return self._collection, self._embedding_func
+
+    def get_collection(self, name):
+        """Returns another (cosine) collection of the same Chroma client."""
+        with self._lock:
+            self._ensure_loaded()
+            client = self._client
+        return client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+    def embed_query(self, text):
+        """
+        Embeds a query, memoising recent ones: the router, the semantic cache
+        and RAG all embed the same user message during one request.
+        """
+        _, embedding_func = self.get()
+        with self._lock:
+            vector = self._query_vectors.get(text)
+            if vector is not None:
+                self._query_vectors.move_to_end(text)
+                return vector
+        vector = embedding_func.embed_query(text)
+        with self._lock:
+            self._query_vectors[text] = vector
+            if len(self._query_vectors) > 1024:
+                self._query_vectors.popitem(last=False)
+        return vector
+
+    def warm_up(self):
+        """Loads the store, recording (not raising) any error for readiness checks."""
+        try:
+            self.get()
+        except Exception as e:
+            print(f"Vector Store Warm-up Error: {e}")
+
+    def reload(self):
+        """Drops the current client and model and loads fresh ones."""
+        with self._lock:
+            self._release()
+            self._failed_at = None
+            self._ensure_loaded()
+
+    def shutdown(self):
+        with self._lock:
+            self._release()
+
+    def _ensure_loaded(self):
+        # Caller holds the lock. A failed load is not retried by every request
+        # (each would wait for it in turn), only once the backoff has passed.
+        if self._collection is not None:
+            return
+        if self._failed_at is not None and time.monotonic() - self._failed_at < Config.VECTOR_STORE_RETRY_SECONDS:
+            raise RuntimeError(f"Vector store unavailable: {self.error}")
+        try:
+            self._load()
+        except Exception:
+            self._failed_at = time.monotonic()
+            raise
+        self._failed_at = None
+
+    def _load(self):
+        try:
+            # Ensure directory exists
+            if not os.path.exists(Config.CHROMA_DB_PATH):
+                os.makedirs(Config.CHROMA_DB_PATH)
+
+            client = chromadb.PersistentClient(path=Config.CHROMA_DB_PATH)
+            device = get_device()
+
+            embedding_func = HuggingFaceEmbeddings(
+                model_kwargs={'device': device},
+                model_name=Config.EMBEDDING_MODEL_NAME,
+                encode_kwargs={'normalize_embeddings': True}
+            )
+
+            collection = client.get_or_create_collection(
+                name="medical_knowledge_base",
+                metadata={"hnsw:space": "cosine"}
+            )
+        except Exception as e:
+            self.error = str(e)
+            raise
+        self._client, self._embedding_func, self._collection = client, embedding_func, collection
+        self.error = None
+
+    def _release(self):
+        if self._client is not None and hasattr(self._client, "clear_system_cache"):
+            self._client.clear_system_cache()
+        self._client = self._collection = self._embedding_func = None
+        self._query_vectors.clear()
+
+
+vector_store = VectorStoreHandle()
+
+
 def get_vector_store():
-    # Ensure directory exists
-    if not os.path.exists(Config.CHROMA_DB_PATH):
-        os.makedirs(Config.CHROMA_DB_PATH)
-
-    client = chromadb.PersistentClient(path=Config.CHROMA_DB_PATH)
-    device = get_device()
-    
-    embedding_func = HuggingFaceEmbeddings(
-        model_kwargs={'device': device},
-        model_name=Config.EMBEDDING_MODEL_NAME,
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    return vector_store.get()
+
+
+# The knowledge-base version changes whenever documents are ingested; caches
+# derived from the knowledge base (e.g. the semantic response cache) compare it.
+KB_VERSION_FILE = os.path.join(Config.CHROMA_DB_PATH, "kb_version")
+
+
+def get_kb_version():
+    """Returns the current knowledge-base version ("<ingestion counter>:<document count>")."""
+    collection, _ = get_vector_store()
+    try:
+        with open(KB_VERSION_FILE, "r", encoding="utf-8") as f:
+            counter = f.read().strip() or "0"
+    except OSError:
+        counter = "0"
+    return f"{counter}:{collection.count()}"
+
+
+def bump_kb_version():
+    """Marks the knowledge base as changed (written to a temp file, then renamed)."""
+    try:
+        with open(KB_VERSION_FILE, "r", encoding="utf-8") as f:
+            counter = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        counter = 0
+    tmp_path = KB_VERSION_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(counter + 1))
+    os.replace(tmp_path, KB_VERSION_FILE)
 
-    collection = client.get_or_create_collection(
-        name="medical_knowledge_base",
-        metadata={"hnsw:space": "cosine"}
-    )
-    return collection, embedding_func
 
 def query_trials(query_text: str, n_results=3):
     """
@@ -116,14 +863,15 @@ def query_trials(query_text: str, n_results=3):
     Used by the Medical Researcher Agent.
     """
     try:
-        collection, embedding_func = get_vector_store()
-        query_vec = embedding_func.embed_query(query_text)
-        
-        results = collection.query(
-            query_embeddings=[query_vec],
-            n_results=n_results,
-            where={"type": "trial"} 
-        )
+        with RAG_SECONDS.time():
+            collection, _ = get_vector_store()
+            query_vec = vector_store.embed_query(query_text)
+            
+            results = collection.query(
+                query_embeddings=[query_vec],
+                n_results=n_results,
+                where={"type": "trial"} 
+            )
         
         if not results['documents'] or not results['documents'][0]:
             return ["Info Système : Aucune étude clinique spécifique trouvée en local."]
@@ -132,3 +880,209 @@ def query_trials(query_text: str, n_results=3):
     except Exception as e:
         print(f"Vector Store Query Error: {e}")
         return [f"Erreur de recherche base de données: {str(e)}"]
+
+
+# ==========================================
+# PART 3: INGESTION (bulk loading of the knowledge base)
+# ==========================================
+INGEST_CHECKPOINT_FILE = os.path.join(Config.CHROMA_DB_PATH, "ingest_checkpoint.json")
+TEXT_FIELDS = ("text", "content", "abstract", "body")
+
+
+def iter_source_records(path, text_column=None):
+    """
+    Streams (record_index, text, metadata) from a JSONL, CSV or PDF file
+    without loading it in memory. PDF records are pages.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        import fitz
+        with fitz.open(path) as doc:
+            for page_num, page in enumerate(doc):
+                yield page_num, page.get_text(), {"page": page_num + 1}
+    elif extension == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for index, row in enumerate(csv.DictReader(f)):
+                yield index, _record_text(row, text_column), _scalar_metadata(row, text_column)
+    elif extension in (".jsonl", ".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            for index, line in enumerate(f):
+                if line.strip():
+                    record = json.loads(line)
+                    yield index, _record_text(record, text_column), _scalar_metadata(record, text_column)
+    else:
+        raise ValueError(f"Unsupported file type: {path}")
+
+
+def _record_text(record, text_column):
+    fields = (text_column,) if text_column else TEXT_FIELDS
+    return next((str(record[f]) for f in fields if record.get(f)), "")
+
+
+def _scalar_metadata(record, text_column):
+    """Chroma metadata only accepts scalars; the text itself is the document."""
+    skipped = {text_column} if text_column else set(TEXT_FIELDS)
+    return {
+        k: v for k, v in record.items()
+        if k not in skipped and isinstance(v, (str, int, float, bool)) and v != ""
+    }
+
+
+def chunk_text(text, chunk_size=1000, overlap=150):
+    """Splits text into ~chunk_size character chunks, preferring paragraph and sentence ends."""
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            cut = max(window.rfind("\n\n"), window.rfind(". "))
+            if cut > chunk_size // 2:
+                end = start + cut + 1
+        chunks.append(text[start:end].strip())
+        if end == len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return [c for c in chunks if c]
+
+
+def _load_checkpoint():
+    try:
+        with open(INGEST_CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_checkpoint(checkpoint):
+    tmp_path = INGEST_CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, INGEST_CHECKPOINT_FILE)
+
+
+def _source_key(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def ingest_documents(paths, doc_type="trial", batch_size=512, chunk_size=1000, chunk_overlap=150,
+                     workers=None, text_column=None, resume=True):
+    """
+    Bulk-loads documents into the medical knowledge base.
+    - Records are streamed from each file, chunked and embedded in batches of
+      batch_size chunks, on a multi-process encoding pool when running on CPU.
+    - Chunk ids are content hashes: chunks already stored are neither
+      re-embedded nor duplicated.
+    - After each batch the number of fully ingested records of the file is
+      checkpointed, so an interrupted run resumes where it stopped.
+    Returns a report dict (documents, chunks, skipped chunks, docs/sec...).
+    """
+    collection, embedding_func = get_vector_store()
+    model = embedding_func._client  # The SentenceTransformer behind HuggingFaceEmbeddings
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if get_device() == "cpu" and workers > 1:
+        pool = model.start_multi_process_pool(["cpu"] * workers)
+    max_upsert = vector_store._client.get_max_batch_size()
+
+    checkpoint = _load_checkpoint() if resume else {}
+    report = {"documents": 0, "chunks": 0, "skipped_chunks": 0, "resumed_documents": 0}
+    started = time.time()
+
+    def flush(pending):
+        unique = {}
+        for chunk_id, text, metadata in pending:
+            unique.setdefault(chunk_id, (text, metadata))
+        ids = list(unique)
+        existing = set(collection.get(ids=ids, include=[])["ids"])
+        new_ids = [i for i in ids if i not in existing]
+        report["skipped_chunks"] += len(pending) - len(new_ids)
+        if not new_ids:
+            return
+        documents = [unique[i][0] for i in new_ids]
+        embeddings = model.encode(documents, batch_size=64, normalize_embeddings=True, pool=pool)
+        for offset in range(0, len(new_ids), max_upsert):
+            part = slice(offset, offset + max_upsert)
+            collection.upsert(
+                ids=new_ids[part],
+                embeddings=embeddings[part].tolist(),
+                documents=documents[part],
+                metadatas=[unique[i][1] for i in new_ids[part]],
+            )
+        report["chunks"] += len(new_ids)
+
+    try:
+        for path in paths:
+            key = _source_key(path)
+            done = checkpoint.get(key, 0)
+            report["resumed_documents"] += done
+            pending = []
+            last_index = done - 1
+            for index, text, metadata in iter_source_records(path, text_column):
+                if index < done:
+                    continue
+                base = {**metadata, "type": doc_type, "source": os.path.basename(path)}
+                for chunk_num, chunk in enumerate(chunk_text(text, chunk_size, chunk_overlap)):
+                    chunk_id = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+                    pending.append((chunk_id, chunk, {**base, "chunk": chunk_num}))
+                report["documents"] += 1
+                last_index = index
+                # Flush between records only, so a checkpoint never splits a record.
+                if len(pending) >= batch_size:
+                    flush(pending)
+                    pending = []
+                    checkpoint[key] = last_index + 1
+                    _save_checkpoint(checkpoint)
+                    _print_progress(report, started)
+            if pending:
+                flush(pending)
+            checkpoint[key] = last_index + 1
+            _save_checkpoint(checkpoint)
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+        if report["chunks"]:
+            bump_kb_version()
+
+    elapsed = time.time() - started
+    report["seconds"] = round(elapsed, 2)
+    report["docs_per_sec"] = round(report["documents"] / elapsed, 2) if elapsed else 0.0
+    report["chunks_per_sec"] = round(report["chunks"] / elapsed, 2) if elapsed else 0.0
+    return report
+
+
+def _print_progress(report, started):
+    elapsed = time.time() - started
+    print(f"  {report['documents']} docs, {report['chunks']} chunks "
+          f"({report['documents'] / elapsed:.1f} docs/sec)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MediMind data maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="Import a legacy sessions.json into the SQLite store.")
+    migrate.add_argument("--json", default=SESSION_FILE, help="Path to the legacy sessions.json")
+    ingest = commands.add_parser("ingest", help="Bulk-load JSONL/CSV/PDF documents into the knowledge base.")
+    ingest.add_argument("paths", nargs="+", help="Files to ingest (.jsonl, .csv, .pdf)")
+    ingest.add_argument("--type", default="trial", help="Value of the 'type' metadata (RAG filters on 'trial')")
+    ingest.add_argument("--batch-size", type=int, default=512, help="Chunks embedded and upserted per batch")
+    ingest.add_argument("--chunk-size", type=int, default=1000, help="Characters per chunk")
+    ingest.add_argument("--chunk-overlap", type=int, default=150)
+    ingest.add_argument("--workers", type=int, default=None, help="CPU encoding processes (default: all cores)")
+    ingest.add_argument("--text-column", default=None, help="Field holding the text (default: text/content/abstract/body)")
+    ingest.add_argument("--restart", action="store_true", help="Ignore the checkpoint of previous runs")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_json_sessions(args.json)
+    elif args.command == "ingest":
+        result = ingest_documents(
+            args.paths, doc_type=args.type, batch_size=args.batch_size, chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap, workers=args.workers, text_column=args.text_column,
+            resume=not args.restart,
+        )
+        print(json.dumps(result, indent=4))
@@ -1,10 +1,40 @@
+import json
+import time
+import asyncio
+import logging
 import ollama
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 import fitz  
+import itertools
+from typing import NamedTuple, Optional
 from app.config import Config
+from app.ocr_cache import ocr_cache
+from app.telemetry import VISION_PAGE_SECONDS
+from app.scheduler import scheduler, Priority, SchedulerBusy
 
-def analyze_prescription_stream(image_bytes):
+logger = logging.getLogger("Vision")
+
+# Bump when the vision or text extraction prompt changes: cached page
+# extractions are keyed on it.
+PROMPT_VERSION = "1"
+
+TEXT_EXTRACTION_PROMPT = """
+You are an expert pharmacist assistant. Extract the medications of this document strictly in JSON format:
+{"medicaments": [{"nom": "...", "dosage": "...", "posologie": "..."}]}
+Use "INCERTAIN" for any field that is not in the document.
+"""
+
+_client = None
+
+def get_ollama_client():
+    """Returns the process-wide async Ollama client (one connection pool for all uploads)."""
+    global _client
+    if _client is None:
+        _client = ollama.AsyncClient(host=Config.OLLAMA_HOST)
+    return _client
+
+async def analyze_prescription_stream(image_bytes):
     """
     Sends the image to the local AI to extract medication data.
     """
@@ -30,62 +60,233 @@ def analyze_prescription_stream(image_bytes):
     """
     
     try:
-        stream = ollama.chat(
-            model=Config.VISION_MODEL_NAME,
-            messages=[{
-                'role': 'user',
-                'content': prompt,
-                'images': [image_bytes]
-            }],
-            stream=True 
-        )
-        
-        for chunk in stream:
-            yield chunk['message']['content']
+        async with scheduler.slot(Config.VISION_MODEL_NAME, Priority.OCR):
+            stream = await get_ollama_client().chat(
+                model=Config.VISION_MODEL_NAME,
+                messages=[{
+                    'role': 'user',
+                    'content': prompt,
+                    'images': [image_bytes]
+                }],
+                stream=True 
+            )
+            
+            async for chunk in stream:
+                yield chunk['message']['content']
             
+    except SchedulerBusy:
+        raise  # The upload gets a 429, not an explanation of this error
     except Exception as e:
         yield f"Error: {str(e)}"
 
-def analyze_prescription(image_bytes):
+async def analyze_prescription(image_bytes):
     full_text = ""
-    for chunk in analyze_prescription_stream(image_bytes):
+    async for chunk in analyze_prescription_stream(image_bytes):
         full_text += chunk
     return full_text
 
 
-def process_file_to_images(file_bytes, mime_type):
+def parse_medicaments(text):
+    """Extracts the "medicaments" list from one page's vision output ([] if none)."""
+    try:
+        start = text.find('{')
+        end = text.rfind('}') + 1
+        if start != -1:
+            parsed = json.loads(text[start:end])
+            if "medicaments" in parsed:
+                return parsed["medicaments"]
+    except Exception:
+        pass
+    return []
+
+
+async def extract_medicaments_from_text(text):
+    """Structured extraction for pages that already have text (no vision call needed)."""
+    try:
+        async with scheduler.slot(Config.LLM_MODEL, Priority.OCR):
+            response = await get_ollama_client().chat(
+                model=Config.LLM_MODEL,
+                messages=[{'role': 'user', 'content': f"{TEXT_EXTRACTION_PROMPT}\n\nDOCUMENT:\n{text}"}],
+                format="json"
+            )
+        return parse_medicaments(response['message']['content'])
+    except SchedulerBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Text Extraction Error: {e}")
+        return []
+
+
+async def analyze_pages(pages, max_concurrency=None):
     """
-    Processes raw file bytes into images.
-    Args:
-        file_bytes (bytes): The file content.
-        mime_type (str): The mime type (e.g. 'application/pdf').
-    Returns:
-        list: [(label, PIL_Image, bytes)]
-        str: Error message or None
+    Runs the vision model on several pages at once (at most max_concurrency
+    calls in flight, Config.VISION_CONCURRENCY by default).
+    pages: iterator of DocumentPage. It is consumed lazily, in a worker thread,
+    and only when a slot is free, so at most max_concurrency rendered pages
+    exist at any time.
+    Yields {"index", "label", "text", "medicaments"} as each page completes,
+    i.e. not necessarily in page order (see merge_page_results).
     """
-    processed_images = []
-    try:
-        # Handle PDF
-        if "pdf" in mime_type.lower():
-            with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-                for page_num, page in enumerate(doc):
-                    pix = page.get_pixmap(dpi=200)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    
-                    b = io.BytesIO()
-                    img.save(b, format='JPEG')
-                    processed_images.append((f"Page {page_num + 1}", img, b.getvalue()))
-        
-        # Handle Images
-        else:
-            image = Image.open(io.BytesIO(file_bytes))
-            if image.mode in ("RGBA", "P"): 
-                image = image.convert("RGB")
+    semaphore = asyncio.Semaphore(max_concurrency or Config.VISION_CONCURRENCY)
+    results = asyncio.Queue()
+    done = object()
+    failed = []  # First page error: no page is started after it
+
+    async def analyze(index, page):
+        try:
+            if page.text is not None:
+                page_bytes, model = page.text.encode("utf-8"), Config.LLM_MODEL
+            else:
+                page_bytes, model = page.image_bytes, Config.VISION_MODEL_NAME
+            start = time.perf_counter()
+            key = ocr_cache.key(page_bytes, model, PROMPT_VERSION)
+            cached = await asyncio.to_thread(ocr_cache.get, key, len(page_bytes))
             
-            b = io.BytesIO()
-            image.save(b, format='JPEG')
-            processed_images.append(("Image importée", image, b.getvalue()))
+            if cached is not None:
+                text, medicaments = cached["text"], cached["medicaments"]
+            elif page.text is not None:
+                text = page.text
+                medicaments = await extract_medicaments_from_text(text)
+            else:
+                text = await analyze_prescription(page.image_bytes)
+                medicaments = parse_medicaments(text)
             
-        return processed_images, None
+            if cached is None and not text.startswith("Error:"):
+                await asyncio.to_thread(ocr_cache.put, key, text, medicaments)
+            source = "cache" if cached is not None else "text" if page.text is not None else "vision"
+            VISION_PAGE_SECONDS.observe(time.perf_counter() - start, source=source)
+            await results.put({
+                "index": index, "label": page.label, "text": text,
+                "medicaments": medicaments, "cached": cached is not None
+            })
+        except Exception as e:
+            failed.append(e)
+            await results.put(e)  # Raised by the consumer, which then cancels the other pages
+        finally:
+            semaphore.release()
+
+    tasks = []
+
+    async def produce():
+        pages_iter = iter(pages)
+        try:
+            for index in itertools.count():
+                await semaphore.acquire()
+                if failed:
+                    semaphore.release()
+                    break
+                page = await asyncio.to_thread(next, pages_iter, None)
+                if page is None:
+                    semaphore.release()
+                    break
+                tasks.append(asyncio.create_task(analyze(index, page)))
+            await asyncio.gather(*tasks)
+        finally:
+            await results.put(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (result := await results.get()) is not done:
+            if isinstance(result, Exception):
+                raise result
+            yield result
+        await producer  # Surfaces an error of the page iterator
+    finally:
+        # The client may leave mid-document: no page keeps its LLM slot
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+def merge_page_results(page_results):
+    """Merges per-page results in page order: (full_text, medicaments)."""
+    ordered = sorted(page_results, key=lambda r: r["index"])
+    full_text = "\n\n".join(r["text"] for r in ordered)
+    medicaments = [med for r in ordered for med in r["medicaments"]]
+    return full_text, medicaments
+
+
+# Magic bytes of the accepted upload formats
+_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+]
+
+
+def sniff_mime_type(header):
+    """Returns the MIME type of a file from its first bytes, or None if it is not accepted."""
+    header = bytes(header[:16])
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return next((mime for magic, mime in _SIGNATURES if header.startswith(magic)), None)
+
+
+class DocumentError(Exception):
+    """The uploaded file cannot be read as a PDF or an image."""
+
+
+class DocumentPage(NamedTuple):
+    label: str
+    image_bytes: Optional[bytes]  # JPEG sent to the vision model (None for text pages)
+    text: Optional[str]           # Embedded text of text-layer PDF pages
+
+
+def iter_document_pages(file_bytes, mime_type):
+    """
+    Opens the document now (raising DocumentError if it is unreadable) and
+    returns a generator producing one DocumentPage at a time, so that only
+    the page being processed is held in memory.
+    - PDF pages with a text layer are returned as text, without rasterising.
+    - Other pages are rendered at a DPI chosen from the page size, and every
+      image is downscaled to Config.VISION_MAX_SIDE (the vision model's useful
+      input size) before JPEG encoding.
+    """
+    try:
+        if "pdf" in mime_type.lower():
+            doc = fitz.open(stream=file_bytes, filetype="pdf")
+            return _iter_pdf_pages(doc)
+        image = Image.open(io.BytesIO(file_bytes))
+        image.verify()  # Cheap header/structure check; the pixels are decoded later
+        return _iter_image_page(file_bytes)
     except Exception as e:
-        return None, f"Erreur fichier : {str(e)}"
\ No newline at end of file
+        raise DocumentError(f"Erreur fichier : {str(e)}") from e
+
+
+def _iter_pdf_pages(doc):
+    with doc:
+        for page_num, page in enumerate(doc):
+            label = f"Page {page_num + 1}"
+            text = page.get_text().strip()
+            if len(text) >= Config.PDF_TEXT_MIN_CHARS:
+                yield DocumentPage(label, None, text)
+                continue
+            # DPI that renders the longest side at about VISION_MAX_SIDE pixels
+            longest_side_inches = max(page.rect.width, page.rect.height) / 72
+            dpi = max(72, min(200, int(Config.VISION_MAX_SIDE / longest_side_inches)))
+            pix = page.get_pixmap(dpi=dpi)
+            image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            del pix
+            yield DocumentPage(label, _to_jpeg(image), None)
+
+
+def _iter_image_page(file_bytes):
+    image = Image.open(io.BytesIO(file_bytes))
+    # JPEG photos can be decoded directly at a reduced scale
+    image.draft("RGB", (Config.VISION_MAX_SIDE, Config.VISION_MAX_SIDE))
+    image = ImageOps.exif_transpose(image)
+    yield DocumentPage("Image importée", _to_jpeg(image), None)
+
+
+def _to_jpeg(image):
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((Config.VISION_MAX_SIDE, Config.VISION_MAX_SIDE))
+    b = io.BytesIO()
+    image.save(b, format='JPEG', quality=90)
+    return b.getvalue()
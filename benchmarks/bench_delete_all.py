@@ -0,0 +1,97 @@
+"""
+Benchmark of the bulk session delete.
+
+Fills a throw-away session database with N sessions (and a few messages
+each), then times delete_all_sessions() against the old per-session loop.
+The bulk delete should stay flat as N grows; the loop grows linearly.
+
+    python benchmarks/bench_delete_all.py --sizes 100 1000 10000 50000
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import datetime
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def populate(store, n, messages_per_session):
+    """Bulk-inserts n live sessions in one transaction; returns their ids."""
+    now = str(datetime.datetime.now())
+    ids = [str(uuid.uuid4()) for _ in range(n)]
+
+    def insert(conn):
+        start = conn.execute("SELECT value FROM counters WHERE name = 'session_epoch'").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO sessions (id, title, timestamp, updated_at, message_count, epoch) VALUES (?, ?, ?, ?, ?, ?)",
+            [(sid, "bench", now, now, messages_per_session, start + i + 1) for i, sid in enumerate(ids)],
+        )
+        conn.execute("UPDATE counters SET value = ? WHERE name = 'session_epoch'", (start + n,))
+        conn.executemany(
+            "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+            [(sid, "user" if k % 2 == 0 else "assistant", "lorem ipsum " * 20)
+             for sid in ids for k in range(messages_per_session)],
+        )
+    store._writer.submit(insert)
+    return ids
+
+
+def wait_for_compaction(store, timeout=600):
+    start = time.perf_counter()
+    conn = store._connect()
+    while conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]:
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("compaction did not finish")
+        time.sleep(0.05)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the bulk session delete against the per-session loop.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--messages", type=int, default=4, help="Messages per session")
+    parser.add_argument("--loop-max", type=int, default=5000,
+                        help="Largest size also timed with the per-session loop (it is slow)")
+    parser.add_argument("--output", help="Writes the results as JSON to this file")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-sessions-")
+    os.environ["SESSION_DB_PATH"] = os.path.join(tmp, "sessions.db")
+    sys.path.insert(0, ROOT)
+    from app import vector_store as store
+
+    results = []
+    print(f"{'sessions':>10} {'bulk delete (ms)':>18} {'compaction (s)':>15} {'loop delete (ms)':>18}")
+    for n in args.sizes:
+        populate(store, n, args.messages)
+        start = time.perf_counter()
+        store.delete_all_sessions()
+        bulk_ms = (time.perf_counter() - start) * 1000
+        assert store.list_sessions(limit=1) == []
+        compaction_s = wait_for_compaction(store)
+
+        loop_ms = None
+        if n <= args.loop_max:
+            ids = populate(store, n, args.messages)
+            start = time.perf_counter()
+            for sid in ids:
+                store.delete_session(sid)
+            loop_ms = (time.perf_counter() - start) * 1000
+
+        results.append({"sessions": n, "bulk_ms": round(bulk_ms, 3),
+                        "compaction_s": round(compaction_s, 3),
+                        "loop_ms": round(loop_ms, 3) if loop_ms is not None else None})
+        loop = f"{loop_ms:.1f}" if loop_ms is not None else "-"
+        print(f"{n:>10} {bulk_ms:>18.2f} {compaction_s:>15.2f} {loop:>18}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
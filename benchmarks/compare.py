@@ -0,0 +1,76 @@
+"""
+Compares two result files of benchmarks/run.py (e.g. before/after a change):
+
+    python benchmarks/compare.py bench/main.json bench/HEAD.json --threshold 10
+
+Prints latency percentiles, throughput and per-node means side by side.
+Exits with status 1 if p95 latency or throughput regresses by more than
+--threshold percent in any scenario.
+"""
+import sys
+import json
+import argparse
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def fmt(value, unit=""):
+    return "-" if value is None else f"{value:,.1f}{unit}"
+
+
+def row(label, old, new, unit=""):
+    delta = change(old, new)
+    print(f"  {label:<22} {fmt(old, unit):>12} {fmt(new, unit):>12} {fmt(delta, '%') if delta is not None else '-':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diffs two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Regression (in %%) of p95 latency or throughput that fails the comparison")
+    args = parser.parse_args()
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r", encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['meta'].get('commit')}  ({baseline['meta'].get('timestamp')})")
+    print(f"candidate {candidate['meta'].get('commit')}  ({candidate['meta'].get('timestamp')})")
+
+    regressions = []
+    for scenario, new in candidate["scenarios"].items():
+        old = baseline["scenarios"].get(scenario)
+        if old is None:
+            continue
+        print(f"\n{scenario}  (errors {old['errors']} -> {new['errors']})")
+        print(f"  {'':<22} {'baseline':>12} {'candidate':>12} {'change':>9}")
+        for q in ("p50", "p95", "p99"):
+            row(f"latency {q} (ms)", old["latency_ms"][q], new["latency_ms"][q])
+        row("throughput (req/s)", old["throughput_rps"], new["throughput_rps"])
+        for node in sorted(set(old.get("nodes", {})) | set(new.get("nodes", {}))):
+            row(f"{node} (ms)", old.get("nodes", {}).get(node, {}).get("mean_ms"),
+                new.get("nodes", {}).get(node, {}).get("mean_ms"))
+
+        latency = change(old["latency_ms"]["p95"], new["latency_ms"]["p95"])
+        throughput = change(old["throughput_rps"], new["throughput_rps"])
+        if latency is not None and latency > args.threshold:
+            regressions.append(f"{scenario}: p95 latency +{latency:.1f}%")
+        if throughput is not None and -throughput > args.threshold:
+            regressions.append(f"{scenario}: throughput {throughput:.1f}%")
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{scenario}: {new['errors'] - old['errors']} more errors")
+
+    if regressions:
+        print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("\nNo regression above the threshold.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Local stand-in for the LLM servers, so the app can be benchmarked offline.
+
+Serves the OpenAI-compatible /v1/chat/completions endpoint (used through
+langchain_openai) and Ollama's /api/chat (vision and text extraction), with
+a configurable time to first token and generation speed:
+
+  - free text: a canned answer, streamed token by token,
+  - JSON-schema structured output: the canned object for the schema name
+    (SupervisorDecision, GuardianVerdict, FairnessMetrics...), or a minimal
+    instance built from the schema,
+  - JSON mode: the canned document keywords,
+  - Ollama: the canned prescription object.
+
+Run standalone with `python benchmarks/mock_llm.py --port 11999`, or start
+it in-process with start_mock_server() (benchmarks/run.py does).
+"""
+import json
+import time
+import asyncio
+import argparse
+import threading
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+DEFAULT_ANSWER = (
+    "Paracetamol and ibuprofen can usually be taken together, because they work differently. "
+    "Respect the maximum daily dose of each one, take ibuprofen with food, and ask your "
+    "pharmacist if you have stomach, kidney or heart problems. ||DATA|| "
+    '{"Médicament": "Paracétamol", "Posologie": "1 g toutes les 6 h", "Maximum": "4 g par jour"}'
+)
+
+DEFAULT_CANNED = {
+    "SupervisorDecision": {"next_step": "COMPLEX_MEDICAL"},
+    "GuardianVerdict": {"status": "APPROVED", "feedback": "OK"},
+    "FairnessMetrics": {"toxicity_score": 0, "complexity_score": 3, "bias_detected": False,
+                        "reasoning": "Plain, neutral language."},
+    "keywords": {"Médicament": "Doliprane", "Dosage": "1000mg", "Fréquence": "Matin et soir"},
+    "json": {"medicaments": [{"nom": "Doliprane", "dosage": "1000mg", "posologie": "1 comprimé matin et soir"}]},
+}
+
+
+@dataclass
+class MockSettings:
+    latency_ms: float = 200.0        # Time to first token
+    tokens_per_sec: float = 50.0     # Generation speed (0: instantaneous)
+    answer: str = DEFAULT_ANSWER     # Free-text completions
+    canned: dict = field(default_factory=lambda: dict(DEFAULT_CANNED))
+
+
+def example_from_schema(schema, defs=None):
+    """Smallest instance of a JSON schema (first enum value, empty strings, zeros)."""
+    defs = defs or schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_from_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        return example_from_schema(schema["anyOf"][0], defs)
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {name: example_from_schema(sub, defs) for name, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    return {"string": "ok", "integer": 0, "number": 0.0, "boolean": False, "null": None}.get(kind, None)
+
+
+def _tokens(text):
+    # Whitespace-separated words stand in for tokens (the trailing space keeps the text intact).
+    return [word + " " for word in text.split(" ")]
+
+
+def create_mock_app(settings: MockSettings):
+    app = FastAPI()
+    app.state.calls = 0
+
+    def completion_text(body):
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            spec = response_format.get("json_schema", {})
+            name = spec.get("name")
+            content = settings.canned.get(name) or example_from_schema(spec.get("schema", {}))
+            return json.dumps(content, ensure_ascii=False)
+        if response_format.get("type") == "json_object":
+            return json.dumps(settings.canned["keywords"], ensure_ascii=False)
+        return settings.answer
+
+    async def generate(text):
+        """Yields the tokens of text at the configured pace."""
+        await asyncio.sleep(settings.latency_ms / 1000)
+        delay = 1 / settings.tokens_per_sec if settings.tokens_per_sec > 0 else 0
+        for token in _tokens(text):
+            if delay:
+                await asyncio.sleep(delay)
+            yield token
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        text = completion_text(body)
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        completion_tokens = len(_tokens(text))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        base = {"id": "mock", "created": int(time.time()), "model": body.get("model", "mock")}
+
+        if not body.get("stream"):
+            generated = "".join([token async for token in generate(text)])
+            return {**base, "object": "chat.completion", "usage": usage,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": generated}}]}
+
+        async def events():
+            async for token in generate(text):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            last = {**base, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            if (body.get("stream_options") or {}).get("include_usage"):
+                last["usage"] = usage
+            yield f"data: {json.dumps(last)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        text = json.dumps(settings.canned["json"], ensure_ascii=False)
+        base = {"model": body.get("model", "mock"), "created_at": "2024-01-01T00:00:00Z"}
+
+        if not body.get("stream", True):
+            generated = "".join([token async for token in generate(text)])
+            return {**base, "message": {"role": "assistant", "content": generated}, "done": True,
+                    "eval_count": len(_tokens(text))}
+
+        async def lines():
+            async for token in generate(text):
+                yield json.dumps({**base, "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+            yield json.dumps({**base, "message": {"role": "assistant", "content": ""}, "done": True,
+                              "eval_count": len(_tokens(text))}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def start_mock_server(settings: MockSettings, host="127.0.0.1", port=11999):
+    """Starts the mock in a daemon thread and returns the uvicorn server once it accepts requests."""
+    app = create_mock_app(settings)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-llm", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"mock LLM server failed to start on {host}:{port}")
+        time.sleep(0.05)
+    server.app = app
+    return server
+
+
+def settings_from_args(args):
+    settings = MockSettings(latency_ms=args.latency_ms, tokens_per_sec=args.tokens_per_sec)
+    if args.answer_file:
+        with open(args.answer_file, "r", encoding="utf-8") as f:
+            settings.answer = f.read().strip()
+    if args.canned:
+        with open(args.canned, "r", encoding="utf-8") as f:
+            settings.canned.update(json.load(f))
+    return settings
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mock time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="Mock generation speed (0: instant)")
+    parser.add_argument("--answer-file", help="Text file used as the free-text answer")
+    parser.add_argument("--canned", help="JSON file {schema name, 'keywords' or 'json': object} overriding canned outputs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible and Ollama LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11999)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_mock_app(settings_from_args(args)), host=args.host, port=args.port, log_level="warning")
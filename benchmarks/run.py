@@ -0,0 +1,292 @@
+"""
+Offline benchmark of the chat and upload paths.
+
+Starts the mock LLM server (benchmarks/mock_llm.py), points the app at it,
+then drives each scenario at the requested concurrency:
+
+  graph   graph.ainvoke() on the agent graph alone (also reports per-node time)
+  chat    POST /api/chat through the full FastAPI app (sessions, context, pipeline)
+  upload  POST /api/upload with a generated prescription image (vision + explanation)
+
+and writes p50/p95/p99 latency, throughput and per-node time to a JSON file
+that benchmarks/compare.py can diff between commits:
+
+    python benchmarks/run.py --requests 50 --concurrency 8 --output bench/HEAD.json
+
+The embedding model and the Chroma knowledge base are the real ones (RAG and
+the supervisor's fast path are part of what is measured); sessions and the
+OCR cache go to a throw-away directory.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.mock_llm import start_mock_server, settings_from_args, add_mock_arguments  # noqa: E402
+
+QUERIES = [
+    ("Can I take ibuprofen with my blood pressure medication?", "English"),
+    ("Puis-je mélanger le paracétamol et l'ibuprofène ?", "Français"),
+    ("I have had a headache and blurred vision for three days, what should I do?", "English"),
+    ("Est-ce que l'amoxicilline est compatible avec l'alcool ?", "Français"),
+    ("What is cholesterol?", "English"),
+    ("¿Puedo tomar aspirina si estoy embarazada?", "Espagnol"),
+    ("Mon enfant a de la fièvre et des boutons depuis hier", "Français"),
+    ("Is it safe to take aspirin while on warfarin?", "English"),
+]
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) with linear interpolation; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies_ms):
+    return {
+        "p50": percentile(latencies_ms, 50),
+        "p95": percentile(latencies_ms, 95),
+        "p99": percentile(latencies_ms, 99),
+        "mean": sum(latencies_ms) / len(latencies_ms) if latencies_ms else None,
+        "max": max(latencies_ms) if latencies_ms else None,
+    }
+
+
+async def drive(call, requests, concurrency, warmup):
+    """Runs call(i) requests times, at most concurrency at once; returns the scenario stats."""
+    for i in range(warmup):
+        await call(-1 - i)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(i)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                errors.append(repr(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency_ms": summarize(latencies),
+    }
+
+
+def make_node_timer():
+    """Callback handler recording the wall time of every graph node run."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class NodeTimer(BaseCallbackHandler):
+        run_inline = True  # Timestamps taken on the event loop, not in an executor
+
+        def __init__(self):
+            self.started = {}
+            self.durations = defaultdict(list)
+
+        def on_chain_start(self, serialized, inputs, *, run_id, name=None, metadata=None, **kwargs):
+            node = (metadata or {}).get("langgraph_node")
+            if node and name == node:
+                self.started[run_id] = (node, time.perf_counter())
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            if run_id in self.started:
+                node, start = self.started.pop(run_id)
+                self.durations[node].append((time.perf_counter() - start) * 1000)
+
+        on_chain_error = on_chain_end
+
+        def report(self):
+            return {
+                node: {"count": len(values), "mean_ms": sum(values) / len(values),
+                       "p95_ms": percentile(values, 95), "total_ms": sum(values)}
+                for node, values in sorted(self.durations.items())
+            }
+
+    return NodeTimer()
+
+
+async def bench_graph(args):
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from app.graph import graph
+    from app.budget import new_budget
+
+    timer = make_node_timer()
+
+    async def call(i):
+        query, language = QUERIES[i % len(QUERIES)]
+        inputs = {
+            "messages": [SystemMessage(content=f"IMPORTANT: You must answer strictly in {language}."),
+                         HumanMessage(content=query)],
+            "user_profile": {"age": str(30 + i % 40), "language": language, "literacy_level": "Simple"},
+            "iteration_count": 0,
+            "critique_feedback": "",
+            "budget": new_budget(),
+            "tokens_used": 0,
+        }
+        config = {"callbacks": [timer]} if i >= 0 else {}
+        await graph.ainvoke(inputs, config=config)
+
+    result = await drive(call, args.requests, args.concurrency, args.warmup)
+    result["nodes"] = timer.report()
+    return result
+
+
+def test_image(i):
+    """A prescription-like JPEG; the request index is drawn in so every page misses the OCR cache."""
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (1240, 1754), "white")
+    draw = ImageDraw.Draw(image)
+    lines = ["Dr. Martin - Médecine générale", "", "Doliprane 1000mg", "1 comprimé matin et soir pendant 5 jours",
+             "", "Amoxicilline 500mg", "1 gélule 3 fois par jour", "", f"Ordonnance n° {i} - {random.random()}"]
+    for row, line in enumerate(lines):
+        draw.text((100, 150 + row * 60), line, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def bench_http(args, scenario, client):
+    import server
+
+    upload_bytes = None
+    if scenario == "upload" and args.upload_file:
+        with open(args.upload_file, "rb") as f:
+            upload_bytes = f.read()
+
+    async def call(i):
+        session_id = (await client.post("/api/new_session")).json()["session_id"]
+        query, language = QUERIES[i % len(QUERIES)]
+        if scenario == "chat":
+            response = await client.post("/api/chat", json={
+                "session_id": session_id, "message": query, "age": 40,
+                "language": language, "literacy_level": "Simple"})
+        else:
+            content = upload_bytes or test_image(i)
+            name = os.path.basename(args.upload_file) if args.upload_file else "prescription.jpg"
+            response = await client.post(
+                "/api/upload",
+                data={"session_id": session_id, "age": "40", "language": language},
+                files={"file": (name, content, "application/octet-stream")})
+        response.raise_for_status()
+
+    result = await drive(call, args.requests, args.concurrency, args.warmup)
+    # Background audits and titles must not overlap the next scenario
+    await server.pipeline.drain()
+    return result
+
+
+async def run_scenarios(args):
+    """Runs every scenario on one event loop (the app's HTTP pools are bound to it)."""
+    results = {}
+    if "graph" in args.scenarios:
+        results["graph"] = await bench_graph(args)
+        report("graph", results["graph"])
+
+    http_scenarios = [s for s in args.scenarios if s != "graph"]
+    if http_scenarios:
+        import httpx
+        import server
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+                for scenario in http_scenarios:
+                    results[scenario] = await bench_http(args, scenario, client)
+                    report(scenario, results[scenario])
+    return results
+
+
+def report(scenario, result):
+    latency = result["latency_ms"]
+    print(f"{scenario}: p50 {latency['p50'] or 0:.0f} ms  p95 {latency['p95'] or 0:.0f} ms  "
+          f"p99 {latency['p99'] or 0:.0f} ms  {result['throughput_rps']} req/s  errors {result['errors']}")
+    for node, stats in result.get("nodes", {}).items():
+        print(f"    {node:<16} {stats['mean_ms']:8.0f} ms mean  ({stats['count']} runs)")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark against a mock LLM.")
+    parser.add_argument("--scenarios", nargs="+", choices=["graph", "chat", "upload"], default=["graph", "chat", "upload"])
+    parser.add_argument("--requests", type=int, default=40, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests run first")
+    parser.add_argument("--upload-file", help="Document sent by the upload scenario (default: generated image)")
+    parser.add_argument("--semantic-cache", action="store_true", help="Keep the semantic response cache on")
+    parser.add_argument("--port", type=int, default=11999, help="Port of the mock LLM server")
+    parser.add_argument("--llm-url", help="Use this OpenAI-compatible/Ollama host instead of the mock")
+    parser.add_argument("--output", default="benchmark_results.json")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    if args.llm_url:
+        host = args.llm_url.rstrip("/")
+    else:
+        start_mock_server(settings_from_args(args), port=args.port)
+        host = f"http://127.0.0.1:{args.port}"
+
+    # The app reads its configuration at import time: set it up first.
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "LLM_BASE_URL": f"{host}/v1",
+        "OLLAMA_HOST": host,
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+        "OCR_CACHE_DIR": os.path.join(workdir, "ocr_cache"),
+        "SEMANTIC_CACHE_ENABLED": "true" if args.semantic_cache else "false",
+    })
+    os.chdir(ROOT)  # server.py mounts ./static
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "mock": None if args.llm_url else {"latency_ms": args.latency_ms, "tokens_per_sec": args.tokens_per_sec},
+            "semantic_cache": args.semantic_cache,
+        },
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}")
+    results["scenarios"] = asyncio.run(run_scenarios(args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
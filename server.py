@@ -1,36 +1,72 @@
-import os
-import shutil
+import asyncio
 import json
+import re
+import time
+import logging
+import hmac
+import hashlib
 import uvicorn
+import threading
 import traceback
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request, Query
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv
 
 # --- INTERNAL IMPORTS ---
-from app.vision import analyze_prescription_stream, process_file_to_images
-from app.graph import graph
+from app.vision import analyze_pages, merge_page_results, iter_document_pages, sniff_mime_type, DocumentError
+from app.graph import graph, should_retry
+from app.budget import new_budget, usage_report
+from app.telemetry import start_trace, render_metrics, HTTP_REQUEST_SECONDS
 from app.config import Config
-from app.fairness import FairnessAuditor
-from app.llm import get_llm
+from app.llm import close_http_clients
+from app.scheduler import scheduler, Priority, SchedulerBusy
+from app.post_processing import pipeline
+from app.router import router
+from app.semantic_cache import semantic_cache
+from app.ocr_cache import ocr_cache
+from app.context import build_context
+from app.document_pipeline import explain_document, structure_medicaments
+from app.drug_index import drug_index
 from app.vector_store import (
     create_session, 
     save_message_to_session, 
     get_session_history, 
     delete_session, 
-    get_all_sessions,
-    update_session_title 
+    delete_all_sessions,
+    list_sessions,
+    sessions_stamp,
+    session_stamp,
+    get_session_page,
+    session_cache_stats,
+    get_message,
+    get_session_summary,
+    session_lock,
+    vector_store
 )
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import SystemMessage
 
 load_dotenv()
+logger = logging.getLogger("Server")
 
-app = FastAPI()
-auditor = FairnessAuditor()
-llm = get_llm()
+@asynccontextmanager
+async def lifespan(app):
+    # Load the embedding model in the background so the server accepts
+    # requests immediately; /api/health reports when RAG is ready.
+    threading.Thread(target=vector_store.warm_up, name="vector-store-warmup", daemon=True).start()
+    threading.Thread(target=drug_index.warm_up, name="drug-index-warmup", daemon=True).start()
+    yield
+    await pipeline.shutdown()
+    vector_store.shutdown()
+    await close_http_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount Static Files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -40,7 +76,58 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Has-More", "X-Next-Cursor", "Retry-After"] + ([Config.TRACE_ID_HEADER] if Config.TRACE_ID_HEADER else []),
 )
+# Event streams are excluded by the middleware itself, so tokens are not buffered.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    """Rejects oversized uploads from their Content-Length, before the body is spooled."""
+    if request.url.path.startswith("/api/upload"):
+        length = request.headers.get("content-length")
+        # Allowance for the multipart envelope and the form fields
+        if length and length.isdigit() and int(length) > Config.MAX_UPLOAD_BYTES + 64 * 1024:
+            return JSONResponse(status_code=413, content={"detail": "Fichier trop volumineux"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    """
+    Times every request (by route template) and attaches a trace that the
+    graph fills node by node; its id is returned in Config.TRACE_ID_HEADER.
+    """
+    incoming = request.headers.get(Config.TRACE_ID_HEADER) if Config.TRACE_ID_HEADER else None
+    trace = start_trace(incoming if incoming and re.fullmatch(r"[\w.-]{1,64}", incoming) else None)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route,
+                                 status=response.status_code)
+    if Config.TRACE_ID_HEADER:
+        response.headers[Config.TRACE_ID_HEADER] = trace.trace_id
+    nodes = trace.summary()
+    if nodes:  # Streamed responses finish after this point and are only in /metrics
+        logger.info(f"trace={trace.trace_id} route={route} seconds={time.perf_counter() - start:.3f} nodes={json.dumps(nodes)}")
+    return response
+
+@app.exception_handler(SchedulerBusy)
+async def llm_busy(request: Request, exc: SchedulerBusy):
+    """The LLM queues are full: ask the client to come back later."""
+    return JSONResponse(status_code=429, content={"detail": "Service saturé, réessayez plus tard"},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+def conditional_json(request: Request, stamp, build, headers=None):
+    """
+    Returns a 304 when the client's If-None-Match matches the ETag derived
+    from stamp (and the query string); otherwise builds the JSON body.
+    """
+    digest = hashlib.sha1(repr((stamp, str(request.url.query))).encode()).hexdigest()[:20]
+    etag = f'W/"{digest}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    content, extra = build()
+    return JSONResponse(content=content, headers={"ETag": etag, "Cache-Control": "no-cache", **extra})
 
 class ChatRequest(BaseModel):
     session_id: str
@@ -49,24 +136,6 @@ class ChatRequest(BaseModel):
     language: str
     literacy_level: str
 
-# --- HELPER: TITLE GENERATION ---
-def generate_title(history):
-    try:
-        messages = []
-        for msg in history[-4:]: 
-            if msg['role'] == 'user': messages.append(HumanMessage(content=msg['content']))
-            elif msg['role'] == 'assistant': messages.append(AIMessage(content=msg['content']))
-        
-        prompt = "Génère un titre de 3-4 mots maximum résumant cette conversation médicale ou ce document. Réponds uniquement avec le titre."
-        messages.append(HumanMessage(content=prompt))
-        
-        response = llm.invoke(messages)
-        title = response.content.strip().replace('"', '').replace("'", "")
-        return title if len(title) < 50 else title[:50]
-    except Exception as e:
-        print(f"Title Gen Error: {e}")
-        return "Conversation Médicale"
-
 # --- ROUTES ---
 
 @app.get("/")
@@ -74,29 +143,89 @@ def read_root():
     from fastapi.responses import FileResponse
     return FileResponse('static/index.html')
 
+@app.get("/api/health")
+def health():
+    return {
+        "status": "ok",
+        "vector_store_ready": vector_store.ready,
+        "vector_store_error": vector_store.error
+    }
+
+@app.get("/api/stats")
+def stats():
+    return {
+        "router": router.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "ocr_cache": ocr_cache.stats(),
+        "session_cache": session_cache_stats(),
+        "llm_scheduler": scheduler.stats(),
+        "drug_index": drug_index.stats()
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/vector_store/reload")
+def reload_vector_store(x_admin_token: Optional[str] = Header(None)):
+    """Admin only: needs X-Admin-Token = Config.ADMIN_TOKEN (disabled when unset)."""
+    if not Config.ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    try:
+        vector_store.reload()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"vector_store_ready": vector_store.ready}
+
 @app.post("/api/new_session")
-def new_session():
-    session_id = create_session()
+def new_session(user_id: Optional[str] = None):
+    session_id = create_session(user_id=user_id)
     return {"session_id": session_id}
 
 @app.get("/api/history")
-def get_history():
-    sessions = get_all_sessions()
-    valid_sessions = []
-    for k, v in sessions.items():
-        if v.get("history") and len(v["history"]) > 0:
-            valid_sessions.append({
-                "id": k, 
-                "title": v.get("title", "Nouvelle conversation"), 
-                "timestamp": v.get("timestamp", "")
-            })
-    sorted_sessions = sorted(valid_sessions, key=lambda x: x['timestamp'], reverse=True)
-    return sorted_sessions
+def get_history(request: Request, before: Optional[str] = None, limit: Optional[int] = Query(None, ge=1, le=500),
+                user_id: Optional[str] = None):
+    """
+    Sessions, most recent first. Pass limit to paginate: X-Next-Cursor is
+    then the value of before for the next page.
+    """
+    cursor = None
+    if before:
+        timestamp, _, sid = before.rpartition("|")
+        cursor = (timestamp, sid)
+
+    def build():
+        # Metadata index only: one row per session, already sorted, no message read.
+        sessions = list_sessions(before=cursor, limit=limit + 1 if limit else None, user_id=user_id)
+        if limit and len(sessions) > limit:
+            sessions = sessions[:limit]
+            last = sessions[-1]
+            return sessions, {"X-Has-More": "true", "X-Next-Cursor": f"{last['timestamp']}|{last['id']}"}
+        return sessions, {"X-Has-More": "false"}
+    return conditional_json(request, sessions_stamp(user_id), build)
 
 @app.get("/api/messages/{session_id}")
-def get_messages(session_id: str):
-    history = get_session_history(session_id)
-    return [msg for msg in history if msg['role'] != 'system']
+def get_messages(request: Request, session_id: str, before: Optional[int] = None, since: Optional[int] = None,
+                 limit: Optional[int] = Query(None, ge=1, le=500)):
+    """
+    Messages of a session, oldest first. With limit, the most recent page
+    (or the page before the message id `before`); with since, only the
+    messages newer than that id. X-Has-More tells whether more remain.
+    """
+    def build():
+        messages, has_more = get_session_page(session_id, before=before, since=since, limit=limit)
+        return messages, {"X-Has-More": "true" if has_more else "false"}
+    return conditional_json(request, session_stamp(session_id), build)
+
+@app.get("/api/fairness/{message_id}")
+def get_fairness(message_id: int):
+    message = get_message(message_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    if "fairness" in message:
+        return {"status": "done", "fairness_metrics": message["fairness"]}
+    return {"status": "pending" if pipeline.is_pending(message_id) else "unavailable", "fairness_metrics": None}
 
 @app.delete("/api/session/{session_id}")
 def remove_session(session_id: str):
@@ -104,65 +233,214 @@ def remove_session(session_id: str):
     return {"status": "deleted"}
 
 @app.delete("/api/delete_all_sessions")
-def delete_all_history():
+def delete_all_history(user_id: Optional[str] = None):
     try:
-        sessions = get_all_sessions()
-        ids = list(sessions.keys())
-        for sid in ids:
-            delete_session(sid)
+        # Constant time: the rows are compacted in the background.
+        delete_all_sessions(user_id)
         return {"status": "all_deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/chat")
-def chat_endpoint(req: ChatRequest):
-    try:
-        # 1. Save User Message
+# --- HELPERS: CHAT ---
+# Nodes whose LLM tokens are the answer shown to the user
+ANSWER_NODES = {"general_chat", "simple_medical", "translator"}
+
+def start_chat_turn(req: ChatRequest):
+    """Saves the user message and builds the graph inputs from the session history."""
+    with session_lock(req.session_id):
         save_message_to_session(req.session_id, "user", req.message)
         history = get_session_history(req.session_id)
+    summary, summary_upto = get_session_summary(req.session_id)
+    
+    lc_msgs = []
+    lang_instruction = SystemMessage(content=f"IMPORTANT: You must answer strictly in {req.language}. Do not switch languages.")
+    lc_msgs.append(lang_instruction)
+    # Bounded context: summary + relevant document excerpts + recent turns
+    lc_msgs.extend(build_context(history, summary, summary_upto, req.message))
+    
+    user_profile = {
+        "age": str(req.age),
+        "language": req.language,
+        "literacy_level": req.literacy_level,
+        "context": "Patient using Health App"
+    }
+    
+    return {
+        "messages": lc_msgs,
+        "user_profile": user_profile,
+        "iteration_count": 0,
+        "critique_feedback": "",
+        "budget": new_budget(),
+        "tokens_used": 0
+    }
+
+def save_chat_answer(req: ChatRequest, ai_text: str):
+    """Saves the answer and returns (message_id, updated history)."""
+    with session_lock(req.session_id):
+        message_id = save_message_to_session(req.session_id, "assistant", ai_text)
+        return message_id, get_session_history(req.session_id)
+
+async def finish_chat_turn(req: ChatRequest, ai_text: str):
+    """
+    Saves the answer and hands the fairness audit (and the title of young
+    sessions) to the post-response pipeline. Returns (message_id, job task);
+    both are None when the session no longer exists and nothing was saved.
+    """
+    message_id, history = await run_in_threadpool(save_chat_answer, req, ai_text)
+    if message_id is None:
+        return None, None
+    
+    user_ai_msgs = [m for m in history[:-1] if m['role'] in ['user', 'assistant']]
+    needs_title = len(user_ai_msgs) >= 3 and len(user_ai_msgs) <= 5
+    job = pipeline.submit(req.session_id, message_id, ai_text, history, audit=True, title=needs_title)
+    return message_id, job
+
+def sse(event: str, data) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/chat")
+async def chat_endpoint(req: ChatRequest):
+    scheduler.admit(Config.LLM_MODEL)  # 429 before anything is saved
+    try:
+        inputs = await run_in_threadpool(start_chat_turn, req)
         
-        # 2. Build Message List
-        lc_msgs = []
-        lang_instruction = SystemMessage(content=f"IMPORTANT: You must answer strictly in {req.language}. Do not switch languages.")
-        lc_msgs.append(lang_instruction)
-
-        for msg in history:
-            if msg['role'] == 'user': lc_msgs.append(HumanMessage(content=msg['content']))
-            elif msg['role'] == 'assistant': lc_msgs.append(AIMessage(content=msg['content']))
-            elif msg['role'] == 'system': lc_msgs.append(SystemMessage(content=msg['content']))
-        
-        user_profile = {
-            "age": str(req.age),
-            "language": req.language,
-            "literacy_level": req.literacy_level,
-            "context": "Patient using Health App"
-        }
-        
-        inputs = {
-            "messages": lc_msgs,
-            "user_profile": user_profile,
-            "iteration_count": 0,
-            "critique_feedback": ""
-        }
-        
-        response = graph.invoke(inputs)
+        response = await graph.ainvoke(inputs)
         ai_text = response["messages"][-1].content
         
-        metrics = auditor.audit_text(ai_text)
-        save_message_to_session(req.session_id, "assistant", ai_text)
-        
-        # Auto-Title
-        user_ai_msgs = [m for m in history if m['role'] in ['user', 'assistant']]
-        if len(user_ai_msgs) >= 3 and len(user_ai_msgs) <= 5: 
-             new_title = generate_title(get_session_history(req.session_id))
-             update_session_title(req.session_id, new_title)
+        # The fairness audit follows in the background: GET /api/fairness/{message_id}
+        message_id, _ = await finish_chat_turn(req, ai_text)
         
-        return {"response": ai_text, "fairness_metrics": metrics}
+        return {"response": ai_text, "message_id": message_id, "fairness_metrics": None,
+                "budget": usage_report(response)}
 
     except Exception as e:
         print(f"Chat Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    Streaming variant of /api/chat (server-sent events):
+      node     -> a graph node finished ({"node"})
+      token    -> a piece of the answer being generated ({"text"})
+      retry    -> the Guardian rejected the draft, a new one follows (discard tokens so far)
+      final    -> the complete answer ({"response", "budget"}: tokens and time used)
+      saved    -> the answer was persisted ({"message_id"})
+      fairness -> the fairness audit of the answer (post-response pipeline)
+      title    -> the session was renamed ({"title"})
+      error    -> something failed ({"detail"})
+    """
+    scheduler.admit(Config.LLM_MODEL)
+    inputs = await run_in_threadpool(start_chat_turn, req)
+
+    async def events():
+        try:
+            final_state = {"budget": inputs["budget"], "tokens_used": 0}
+            async for mode, chunk in graph.astream(inputs, stream_mode=["messages", "updates"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") in ANSWER_NODES and message.content:
+                        yield sse("token", {"text": message.content})
+                    continue
+                for node, update in chunk.items():
+                    update = update or {}
+                    # Updates carry each node's own token count: add them up like the graph does
+                    tokens_used = final_state["tokens_used"] + update.get("tokens_used", 0)
+                    final_state.update(update, tokens_used=tokens_used)
+                    yield sse("node", {"node": node})
+                    if node == "guardian" and should_retry(final_state) == "retry":
+                        yield sse("retry", {"feedback": update.get("critique_feedback", "")})
+            
+            ai_text = final_state["messages"][-1].content
+            yield sse("final", {"response": ai_text, "budget": usage_report(final_state)})
+            message_id, job = await finish_chat_turn(req, ai_text)
+            yield sse("saved", {"message_id": message_id})
+            
+            # The answer is complete on screen; the audit and title trail behind.
+            # shield(): a client leaving early must not cancel the persisted job.
+            result = await asyncio.shield(job) if job is not None else {"fairness": None, "title": None}
+            if result["fairness"]:
+                yield sse("fairness", result["fairness"])
+            if result["title"]:
+                yield sse("title", {"title": result["title"]})
+        except Exception as e:
+            print(f"Chat Stream Error: {e}")
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# --- HELPERS: UPLOAD ---
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def read_upload(file: UploadFile):
+    """
+    Reads the upload from Starlette's spool in chunks, stopping as soon as it
+    exceeds Config.MAX_UPLOAD_BYTES (413), and identifies it from its magic
+    bytes rather than the client-declared type (415).
+    Returns (file_bytes, mime_type); the bytes are handed to fitz/PIL as is.
+    """
+    chunks = []
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > Config.MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {Config.MAX_UPLOAD_BYTES // (1024 * 1024)} Mo)")
+        chunks.append(chunk)
+    file_bytes = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+    
+    mime_type = sniff_mime_type(file_bytes)
+    if mime_type is None:
+        raise HTTPException(status_code=415, detail="Format non supporté (PDF ou image attendus)")
+    return file_bytes, mime_type
+
+def save_upload_turn(session_id: str, full_text: str, explanation: str):
+    """Saves the document and its explanation, returns (message_id, updated history)."""
+    with session_lock(session_id):
+        save_message_to_session(session_id, "system", f"Uploaded Document Content: {full_text}")
+        message_id = save_message_to_session(session_id, "assistant", explanation)
+        return message_id, get_session_history(session_id)
+
+async def upload_events(file_bytes: bytes, mime_type: str, session_id: str, age: int, language: str):
+    """
+    Runs the whole upload pipeline, yielding (event, data) as it progresses:
+      page   -> one page was read by the vision model (in completion order)
+      token  -> a piece of the explanation being generated ({"text"})
+      result -> the final payload of /api/upload
+    """
+    try:
+        pages = await run_in_threadpool(iter_document_pages, file_bytes, mime_type)
+    except DocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    page_results = []
+    async for page in analyze_pages(pages):
+        page_results.append(page)
+        yield "page", page
+    
+    full_text, raw_meds = merge_page_results(page_results)
+    meds_data = structure_medicaments(raw_meds)
+    
+    # One explanation call (streamed) and one keyword call, no chat graph
+    async for event, data in explain_document(full_text, meds_data, age, language):
+        if event == "token":
+            yield "token", {"text": data}
+    explanation, keywords = data["explanation"], data["keywords"]
+    
+    message_id, history = await run_in_threadpool(save_upload_turn, session_id, full_text, explanation)
+    
+    # Title Logic (in the background)
+    user_msgs = [m for m in history if m['role'] == 'user']
+    if not user_msgs and message_id is not None:
+        pipeline.submit(session_id, message_id, explanation, history, audit=False, title=True)
+    
+    yield "result", {
+        "extracted_text": full_text, 
+        "meds_data": meds_data, 
+        "explanation": explanation,
+        "keywords": keywords
+    }
+
 @app.post("/api/upload")
 async def upload_file(
     file: UploadFile = File(...), 
@@ -170,103 +448,49 @@ async def upload_file(
     age: int = Form(...),
     language: str = Form(...)
 ):
-    temp_filename = f"temp_{file.filename}"
     try:
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        with open(temp_filename, "rb") as f:
-            file_bytes = f.read()
-            
-        images_data, error = process_file_to_images(file_bytes, file.content_type or "application/pdf")
-        
-        if error: 
-            raise HTTPException(status_code=400, detail=error)
-            
-        full_text = ""
-        if images_data:
-            for _, _, img_bytes in images_data:
-                for chunk in analyze_prescription_stream(img_bytes):
-                    full_text += chunk
-        
-        meds_data = []
-        try:
-            start = full_text.find('{')
-            end = full_text.rfind('}') + 1
-            if start != -1:
-                json_str = full_text[start:end]
-                parsed = json.loads(json_str)
-                if "medicaments" in parsed:
-                    meds_data = parsed["medicaments"]
-        except Exception:
-            pass 
-
-        # --- KEYWORD PROMPT ---
-        query = (
-             f"You are a medical assistant for a {age} year old patient. Language: {language}.\n"
-            f"CONTEXT: Raw Text: \"{full_text}\". Structured Data: {json.dumps(meds_data, ensure_ascii=False) if meds_data else 'None'}.\n\n"
-            f"TASK 1: Write a clear, reassuring, and educational explanation for the patient about this document. "
-            f"Explain the purpose, usage, and precautions. Do NOT include technical details and adapt your structure based on the age of the person.\n\n"
-            f"TASK 2: Extract key medical entities into a valid JSON object at the very end.\n"
-            f"Categories (Use {language}): 'Médicament', 'Dosage', 'Fréquence', 'Symptôme', 'Type'. or other categories you highlight and think the user should know\n"
-            f"If multiple values exist, combine them (e.g. 'Doliprane, Advil').\n\n"
-            f"NO INTRODUCTIONS: Do NOT say Hello, I am Doctor X, Here is a response, or As an AI, directly start with the explanation content\n"
-            f"REQUIRED OUTPUT FORMAT:\n"
-            f"[Your Explanation Here]\n"
-            f"||DATA||\n"
-            f"{{ \"Category\": \"Value\" }}"
-        )
-        
-        lc_msgs = [HumanMessage(content=query)]
-        response = graph.invoke({
-            "messages": lc_msgs, 
-            "user_profile": {"age":str(age), "language":language, "literacy_level":"Simple"}, 
-            "iteration_count":0
-        })
-        
-        raw_response = response["messages"][-1].content
-        
-        # --- PARSE ---
-        explanation = raw_response
-        keywords = []
-        
-        if "||DATA||" in raw_response:
-            parts = raw_response.split("||DATA||")
-            explanation = parts[0].strip()
-            try:
-                json_part = parts[1].strip()
-                s = json_part.find('{')
-                e = json_part.rfind('}') + 1
-                if s != -1 and e != -1:
-                    json_str = json_part[s:e]
-                    data_obj = json.loads(json_str)
-                    keywords = [f"{k} : {v}" for k, v in data_obj.items()]
-            except Exception as e:
-                print(f"Keyword Parsing Error: {e}")
-        
-        save_message_to_session(session_id, "system", f"Uploaded Document Content: {full_text}")
-        save_message_to_session(session_id, "assistant", explanation)
-        
-        # Title Logic
-        history = get_session_history(session_id)
-        user_msgs = [m for m in history if m['role'] == 'user']
-        if not user_msgs:
-            new_title = generate_title(history)
-            update_session_title(session_id, new_title)
-        
-        return {
-            "extracted_text": full_text, 
-            "meds_data": meds_data, 
-            "explanation": explanation,
-            "keywords": keywords
-        }
+        scheduler.admit(Config.VISION_MODEL_NAME, Priority.OCR)
+        file_bytes, mime_type = await read_upload(file)
+        async for event, data in upload_events(file_bytes, mime_type, session_id, age, language):
+            if event == "result":
+                return data
 
+    except (HTTPException, SchedulerBusy):
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+
+@app.post("/api/upload/stream")
+async def upload_stream(
+    file: UploadFile = File(...), 
+    session_id: str = Form(...),
+    age: int = Form(...),
+    language: str = Form(...)
+):
+    """
+    Streaming variant of /api/upload (server-sent events): a 'page' event per
+    page as soon as the vision model has read it, 'token' events while the
+    explanation is written, then the 'result' event (same payload as
+    /api/upload), or 'error'.
+    """
+    scheduler.admit(Config.VISION_MODEL_NAME, Priority.OCR)
+    file_bytes, mime_type = await read_upload(file)
+
+    async def events():
+        try:
+            async for event, data in upload_events(file_bytes, mime_type, session_id, age, language):
+                yield sse(event, data)
+        except SchedulerBusy as e:
+            # The stream has already started: the 429 becomes an error event
+            yield sse("error", {"detail": "Service saturé, réessayez plus tard", "retry_after": e.retry_after})
+        except HTTPException as e:
+            yield sse("error", {"detail": e.detail})
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
     uvicorn.run("server:app", host="localhost", port=8000, reload=True)
\ No newline at end of file
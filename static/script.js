@@ -1,5 +1,13 @@
 let currentSessionId = null;
 
+const PAGE_SIZE = 50;
+// What the chat box currently shows, so reloads only fetch what is new.
+let renderedSessionId = null;
+let lastMessageId = 0;
+let firstMessageId = null;
+let historyEtag = null;
+let messagesEtag = null;
+
 // Multilingual Dictionary
 const translations = {
     "Français": {
@@ -66,6 +74,10 @@ async function startNewSession() {
         const res = await fetch('/api/new_session', { method: 'POST' });
         const data = await res.json();
         currentSessionId = data.session_id;
+        renderedSessionId = data.session_id;
+        lastMessageId = 0;
+        firstMessageId = null;
+        messagesEtag = null;
         
         const chatBox = document.getElementById('chatBox');
         chatBox.innerHTML = `
@@ -101,21 +113,19 @@ function resetScanView() {
 
 async function loadHistory() {
     try {
-        const res = await fetch('/api/history');
-        const sessions = await res.json();
+        const headers = historyEtag ? { 'If-None-Match': historyEtag } : {};
+        const res = await fetch(`/api/history?limit=${PAGE_SIZE}`, { headers, cache: 'no-store' });
         const list = document.getElementById('historyList');
+        if (res.status === 304) {
+            // Nothing changed: only move the highlight.
+            list.querySelectorAll('.history-item').forEach(el => el.classList.toggle('active', el.dataset.sid === currentSessionId));
+            return;
+        }
+        historyEtag = res.headers.get('ETag');
+        const sessions = await res.json();
         list.innerHTML = '';
-        
-        sessions.forEach(sess => {
-            const item = document.createElement('div');
-            item.className = `history-item ${sess.id === currentSessionId ? 'active' : ''}`;
-            item.onclick = () => loadChat(sess.id);
-            item.innerHTML = `
-                <span>${sess.title}</span>
-                <i class="fas fa-trash delete-icon" onclick="deleteSession('${sess.id}', event)"></i>
-            `;
-            list.appendChild(item);
-        });
+        appendHistoryItems(list, sessions);
+        appendHistoryMore(list, res);
 
         if (sessions.length > 0) {
             const btn = document.createElement('div');
@@ -127,19 +137,105 @@ async function loadHistory() {
     }
 }
 
+function appendHistoryItems(list, sessions, anchor = null) {
+    sessions.forEach(sess => {
+        const item = document.createElement('div');
+        item.className = `history-item ${sess.id === currentSessionId ? 'active' : ''}`;
+        item.dataset.sid = sess.id;
+        item.onclick = () => loadChat(sess.id);
+        item.innerHTML = `
+            <span>${sess.title}</span>
+            <i class="fas fa-trash delete-icon" onclick="deleteSession('${sess.id}', event)"></i>
+        `;
+        list.insertBefore(item, anchor);
+    });
+}
+
+// "More" entry at the end of the list, fetching the next page of sessions.
+function appendHistoryMore(list, res, anchor = null) {
+    if (res.headers.get('X-Has-More') !== 'true') return;
+    const cursor = res.headers.get('X-Next-Cursor');
+    const more = document.createElement('div');
+    more.className = 'history-item history-more';
+    more.innerHTML = `<span>Plus anciennes...</span>`;
+    more.onclick = async () => {
+        const next = await fetch(`/api/history?limit=${PAGE_SIZE}&before=${encodeURIComponent(cursor)}`);
+        const sessions = await next.json();
+        const after = more.nextSibling;
+        more.remove();
+        appendHistoryItems(list, sessions, after);
+        appendHistoryMore(list, next, after);
+    };
+    list.insertBefore(more, anchor);
+}
+
+function renderMessages(messages) {
+    messages.forEach(msg => {
+        addMessage(msg.content, msg.role, false);
+        if (msg.fairness) addFairnessScorecard(msg.fairness);
+    });
+    if (messages.length > 0) {
+        lastMessageId = Math.max(lastMessageId, messages[messages.length - 1].id);
+        if (firstMessageId === null) firstMessageId = messages[0].id;
+    }
+}
+
 async function loadChat(sessionId) {
     currentSessionId = sessionId;
     await loadHistory();
-    
-    const res = await fetch(`/api/messages/${sessionId}`);
-    const messages = await res.json();
+
     const chatBox = document.getElementById('chatBox');
-    chatBox.innerHTML = ''; 
-    
-    messages.forEach(msg => addMessage(msg.content, msg.role, false)); 
+    if (renderedSessionId === sessionId) {
+        // Already on screen: only fetch the messages stored since.
+        const headers = messagesEtag ? { 'If-None-Match': messagesEtag } : {};
+        const res = await fetch(`/api/messages/${sessionId}?since=${lastMessageId}`, { headers, cache: 'no-store' });
+        if (res.status === 304) return;
+        messagesEtag = res.headers.get('ETag');
+        const messages = await res.json();
+        if (messages.length > 0) document.querySelector('.empty-state')?.remove();
+        renderMessages(messages);
+        scrollToBottom();
+        return;
+    }
+
+    const res = await fetch(`/api/messages/${sessionId}?limit=${PAGE_SIZE}`, { cache: 'no-store' });
+    const messages = await res.json();
+    chatBox.innerHTML = '';
+    renderedSessionId = sessionId;
+    lastMessageId = 0;
+    firstMessageId = null;
+    messagesEtag = null;
+    renderMessages(messages);
+    if (res.headers.get('X-Has-More') === 'true') addLoadEarlier(chatBox);
     scrollToBottom();
 }
 
+// Button at the top of the chat, prepending the previous page of messages.
+function addLoadEarlier(chatBox) {
+    const btn = document.createElement('button');
+    btn.className = 'load-earlier-btn';
+    btn.innerText = 'Messages précédents';
+    btn.onclick = async () => {
+        const sessionId = renderedSessionId;
+        const res = await fetch(`/api/messages/${sessionId}?limit=${PAGE_SIZE}&before=${firstMessageId}`);
+        const messages = await res.json();
+        if (sessionId !== renderedSessionId) return;
+        btn.remove();
+        // Render at the end as usual, then move the new nodes to the top.
+        const anchor = chatBox.firstChild;
+        const count = chatBox.children.length;
+        messages.forEach(msg => {
+            addMessage(msg.content, msg.role, false);
+            if (msg.fairness) addFairnessScorecard(msg.fairness);
+        });
+        Array.from(chatBox.children).slice(count).forEach(node => chatBox.insertBefore(node, anchor));
+        if (messages.length > 0) firstMessageId = messages[0].id;
+        if (res.headers.get('X-Has-More') === 'true') addLoadEarlier(chatBox);
+        chatBox.scrollTop = 0;
+    };
+    chatBox.insertBefore(btn, chatBox.firstChild);
+}
+
 async function sendMessage() {
     const input = document.getElementById('userInput');
     const text = input.value.trim();
@@ -153,8 +249,11 @@ async function sendMessage() {
     const thinkingId = addThinking();
     scrollToBottom();
     
+    let botDiv = null;
+    let answer = "";
+    
     try {
-        const res = await fetch('/api/chat', {
+        const res = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -165,22 +264,91 @@ async function sendMessage() {
                 literacy_level: document.getElementById('userLevel').value
             })
         });
-        const data = await res.json();
-        
-        document.getElementById(thinkingId).remove();
-        addMessage(data.response, 'assistant', true); 
-        
-        if (data.fairness_metrics) {
-            addFairnessScorecard(data.fairness_metrics);
+        if (!res.ok) {
+            const err = await res.json().catch(() => ({}));
+            const wait = res.headers.get('Retry-After');
+            if (res.status === 429) throw Object.assign(new Error(`${err.detail} (${wait} s)`), { busy: true });
+            throw new Error("Erreur serveur");
         }
         
-        loadHistory(); 
+        await readEventStream(res, (event, data) => {
+            if (event === 'token') {
+                if (!botDiv) {
+                    document.getElementById(thinkingId)?.remove();
+                    botDiv = addMessage("", 'assistant', false);
+                }
+                answer += data.text;
+                renderStreamingMessage(botDiv, answer);
+            } else if (event === 'retry') {
+                // The Guardian rejected the draft: a corrected one is coming.
+                answer = "";
+                if (botDiv) botDiv.dataset.pending = "";
+                if (botDiv) botDiv.innerHTML = "<i style='color:#64748b'>Vérification de la réponse...</i>";
+            } else if (event === 'final') {
+                document.getElementById(thinkingId)?.remove();
+                if (!botDiv) botDiv = addMessage("", 'assistant', false);
+                answer = data.response;
+                botDiv.dataset.pending = answer;
+                botDiv.innerHTML = marked.parse(answer);
+                scrollToBottom();
+            } else if (event === 'fairness') {
+                addFairnessScorecard(data);
+            } else if (event === 'saved') {
+                // The answer is already on screen: later reloads start after it.
+                lastMessageId = Math.max(lastMessageId, data.message_id);
+                loadHistory();
+            } else if (event === 'title') {
+                loadHistory();
+            } else if (event === 'error') {
+                throw new Error(data.detail);
+            }
+        });
         
     } catch (e) {
-        if(document.getElementById(thinkingId)) document.getElementById(thinkingId).innerText = "Erreur de connexion.";
+        const message = e.busy ? e.message : "Erreur de connexion.";
+        if(document.getElementById(thinkingId)) document.getElementById(thinkingId).innerText = message;
+        else if (botDiv && !answer) botDiv.innerText = message;
     }
 }
 
+// Reads a text/event-stream response and calls onEvent(event, data) for each event.
+async function readEventStream(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+            const raw = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = "message";
+            let data = "";
+            raw.split("\n").forEach(line => {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            });
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
+
+// Re-renders the markdown at most once per animation frame while tokens arrive.
+function renderStreamingMessage(div, text) {
+    div.dataset.pending = text;
+    if (div.dataset.scheduled) return;
+    div.dataset.scheduled = "1";
+    requestAnimationFrame(() => {
+        delete div.dataset.scheduled;
+        div.innerHTML = marked.parse(div.dataset.pending);
+        scrollToBottom();
+    });
+}
+
 function addMessage(text, role, useTypewriter = false) {
     const box = document.getElementById('chatBox');
     const div = document.createElement('div');
@@ -212,6 +380,7 @@ function addMessage(text, role, useTypewriter = false) {
         }
     }
     scrollToBottom();
+    return div;
 }
 
 function addThinking() {
@@ -338,27 +507,43 @@ async function uploadFile() {
     formData.append('language', document.getElementById('userLang').value || "Français");
     
     try {
-        const res = await fetch('/api/upload', { method: 'POST', body: formData });
-        if(!res.ok) throw new Error("Erreur serveur");
+        const res = await fetch('/api/upload/stream', { method: 'POST', body: formData });
+        if(!res.ok) {
+            const err = await res.json().catch(() => ({}));
+            throw new Error(err.detail || "Erreur serveur");
+        }
         
-        const data = await res.json();
+        const cardsContainer = document.getElementById('medCardsContainer');
+        let pagesRead = 0;
+        let explanation = "";
+        let data = null;
+        
+        await readEventStream(res, (event, payload) => {
+            if (event === 'page') {
+                // Pages arrive as soon as each one is read, in completion order.
+                pagesRead += 1;
+                document.getElementById('scanExplanation').innerHTML = `<i style='color:#64748b'>${payload.label} lue (${pagesRead})... Analyse en cours...</i>`;
+                addMedCards(cardsContainer, payload.medicaments);
+            } else if (event === 'token') {
+                // The explanation is written while the keywords are extracted
+                explanation += payload.text;
+                document.getElementById('scanExplanation').innerHTML = marked.parse(explanation);
+            } else if (event === 'result') {
+                data = payload;
+            } else if (event === 'error') {
+                throw new Error(payload.detail);
+            }
+        });
+        if (!data) throw new Error("Réponse incomplète");
         
         document.getElementById('scanLoader').classList.add('hidden');
         document.getElementById('scanActions').classList.remove('hidden');
         
         document.getElementById('scanExplanation').innerHTML = marked.parse(data.explanation);
         
-        const cardsContainer = document.getElementById('medCardsContainer');
+        // Final cards, in page order
         cardsContainer.innerHTML = "";
-        if (data.meds_data && data.meds_data.length > 0) {
-            data.meds_data.forEach(med => {
-                if (!med.nom || med.nom.toUpperCase().includes("INCERTAIN")) return;
-                const card = document.createElement('div');
-                card.className = 'med-card';
-                card.innerHTML = `<div class="med-name">${med.nom}</div><div class="med-dosage">${med.dosage || ''}</div><div class="med-posology">${med.posologie || ''}</div>`;
-                cardsContainer.appendChild(card);
-            });
-        }
+        addMedCards(cardsContainer, data.meds_data);
         
         const kwContainer = document.getElementById('keywordsContainer');
         kwContainer.innerHTML = "";
@@ -382,6 +567,19 @@ async function uploadFile() {
     }
 }
 
+function addMedCards(container, meds) {
+    if (!meds || meds.length === 0) return;
+    meds.forEach(med => {
+        if (!med.nom || med.nom.toUpperCase().includes("INCERTAIN")) return;
+        const card = document.createElement('div');
+        card.className = 'med-card';
+        // Canonical substance from the drug index, when it differs from the printed name
+        const substance = med.substance && med.substance.toLowerCase() !== med.nom.toLowerCase() ? ` <span class="med-substance">(${med.substance})</span>` : '';
+        card.innerHTML = `<div class="med-name">${med.nom}${substance}</div><div class="med-dosage">${med.dosage || ''}</div><div class="med-posology">${med.posologie || ''}</div>`;
+        container.appendChild(card);
+    });
+}
+
 async function deleteSession(sid, e) {
     e.stopPropagation();
     if(!confirm("Supprimer ?")) return;
@@ -0,0 +1,30 @@
+from app.drug_index import DrugIndex, build_index
+
+
+def _index(tmp_path, names, interactions):
+    (tmp_path / "names.csv").write_text(names, encoding="utf-8")
+    (tmp_path / "interactions.csv").write_text(interactions, encoding="utf-8")
+    output = str(tmp_path / "drug_index.json.gz")
+    build_index([str(tmp_path / "names.csv")], [str(tmp_path / "interactions.csv")], output)
+    index = DrugIndex(output)
+    index.load()
+    return index
+
+
+def test_interaction_found_when_canonical_name_is_not_a_key(tmp_path):
+    # "Fe" is shorter than MIN_NAME_LENGTH: only its synonyms are keys of the index
+    index = _index(tmp_path, "name,synonyms\nFe,iron;ferrous sulfate\n",
+                   "drug_a,drug_b,level\niron,levothyroxine,Moderate\n")
+
+    found = index.find("Can I take ferrous sulfate with levothyroxine?")
+    assert [index.name(i) for i in found] == ["Fe", "levothyroxine"]
+    assert index.interactions(found) == [{"drugs": ["Fe", "levothyroxine"], "level": "Moderate", "description": ""}]
+    assert "Fe + levothyroxine: Moderate interaction." in index.facts(found)
+
+
+def test_resolve_returns_canonical_name(tmp_path):
+    index = _index(tmp_path, "name,synonyms\nParacetamol,Doliprane;acetaminophen\n", "drug_a,drug_b,level\n")
+
+    assert index.resolve("DOLIPRANE 1000 mg") == "Paracetamol"
+    assert index.resolve_id("acetaminophen") == index.find("paracetamol")[0]
+    assert index.resolve("unknown") is None